@@ -0,0 +1,91 @@
+"""
+Import süresi takibi (python -X importtime).
+
+    python -m app.bench_import                    # ölç, baseline ile karşılaştır
+    python -m app.bench_import --update-baseline  # baseline'ı güncelle
+
+Her modül ayrı, temiz bir süreçte import edilir; kümülatif süre (µs) alınır.
+Baseline'a göre --max-ratio katından yavaşlayan modül varsa çıkış kodu 1 olur.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "app.pipeline",
+    "app.validator",
+    "app.run_batch",
+    "app.generator_llm",
+    "services.ai_description",
+]
+
+BASELINE_PATH = "data/importtime_baseline.json"
+
+
+def measure(module: str, repeat: int = 3) -> int:
+    # En iyi (min) değer: disk önbelleği / gürültü etkisini azaltır.
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{module} import edilemedi:\n{proc.stderr[-2000:]}")
+        total = None
+        for line in proc.stderr.splitlines():
+            # "import time:  self | cumulative | module"
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) == 3 and parts[2] == module:
+                total = int(parts[1])
+        if total is None:
+            raise RuntimeError(f"{module} için importtime satırı bulunamadı")
+        best = total if best is None else min(best, total)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bench_import")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--max-ratio", type=float, default=1.5)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    results = {m: measure(m, args.repeat) for m in MODULES}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressed = []
+    for m, us in results.items():
+        base = baseline.get(m)
+        ratio = (us / base) if base else None
+        flag = ""
+        if ratio is not None and ratio > args.max_ratio:
+            regressed.append(m)
+            flag = "  <-- REGRESSION"
+        base_txt = f"{base / 1000:8.1f} ms" if base else "       -   "
+        ratio_txt = f"x{ratio:.2f}" if ratio is not None else ""
+        print(f"{m:28s} {us / 1000:8.1f} ms  (baseline {base_txt}) {ratio_txt}{flag}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"baseline güncellendi: {args.baseline}")
+        return 0
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import select, update, exists, or_, and_, func
+
+from .config import settings
+from .models import Product, Generation, WorkerRun
+from .metrics import estimate_cost
+from .retry_queue import DEAD, queue_summary
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pending_filter(run_id: str, force: bool, now: datetime):
+    """
+    Sahiplenilebilir ürün:
+    - lease yok ya da süresi dolmuş (ölen worker'ın işi geri alınır)
+    - bu run içinde henüz tamamlanmamış
+    - dead-letter'da değil (force'ta da; geri almak için `pipeline requeue`)
+    - force değilse: PASS generation'ı yok ve FAIL sonrası geri çekilme süresi dolmuş
+      (stub'a düşülmüş PASS sayılmaz; o ürünler geri çekilmeyle yeniden denenir)
+    """
+    cond = and_(
+        or_(Product.lease_expires_at.is_(None), Product.lease_expires_at < now),
+        or_(Product.last_run_id.is_(None), Product.last_run_id != run_id),
+        or_(Product.queue_state.is_(None), Product.queue_state != DEAD),
+    )
+    if not force:
+        cond = and_(cond, or_(Product.next_attempt_at.is_(None), Product.next_attempt_at <= now))
+        has_pass = exists().where(
+            Generation.product_id == Product.id,
+            Generation.status == "PASS",
+            Generation.fallback_reason.is_(None),
+        )
+        cond = and_(cond, ~has_pass)
+    return cond
+
+
+def claim_batch(
+    db,
+    worker_id: str,
+    run_id: str,
+    batch_size: int | None = None,
+    lease_seconds: int | None = None,
+    force: bool = False,
+    exclude: Iterable[int] | None = None,
+) -> list[int]:
+    """
+    Bekleyen ürünlerden en yüksek öncelikli en fazla batch_size kadarını atomik olarak sahiplenir.
+    exclude: bu worker'ın şimdilik almak istemediği ürünler (kota yüzünden ertelenenler).
+    - Postgres: alt sorgu FOR UPDATE SKIP LOCKED -> worker'lar birbirini beklemeden ayrık kümeler alır.
+    - SQLite: tek UPDATE ... RETURNING; yazma kilidi zaten seri, iki worker aynı satırı alamaz.
+    """
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=lease_seconds or settings.lease_seconds)
+
+    ids = (
+        select(Product.id)
+        .where(_pending_filter(run_id, force, now))
+        .order_by(Product.priority.desc().nulls_last(), Product.id)
+        .limit(batch_size or settings.claim_batch_size)
+    )
+    exclude = list(exclude or ())
+    if exclude:
+        ids = ids.where(Product.id.not_in(exclude))
+    if db.get_bind().dialect.name != "sqlite":
+        ids = ids.with_for_update(skip_locked=True)
+
+    stmt = (
+        update(Product)
+        .where(Product.id.in_(ids.scalar_subquery()))
+        .values(lease_owner=worker_id, lease_expires_at=expires)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = [r[0] for r in db.execute(stmt).all()]
+    db.commit()
+    return sorted(claimed)
+
+
+def extend_lease(db, worker_id: str, product_ids: list[int], lease_seconds: int | None = None) -> list[int]:
+    """
+    Hâlâ bu worker'da olan lease'leri uzatır; uzatılabilenleri döner.
+    Dönmeyenler süresi dolup başka worker'a geçmiştir, işlenmemeli.
+    """
+    if not product_ids:
+        return []
+    expires = datetime.utcnow() + timedelta(seconds=lease_seconds or settings.lease_seconds)
+    kept = [
+        r[0] for r in db.execute(
+            update(Product)
+            .where(Product.id.in_(product_ids), Product.lease_owner == worker_id)
+            .values(lease_expires_at=expires)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    ]
+    db.commit()
+    return kept
+
+
+def complete(db, worker_id: str, run_id: str, product_ids: list[int]) -> list[int]:
+    """
+    Lease'i bırakır ve ürünü bu run için "bitti" olarak işaretler.
+    Lease'i başka worker'a geçmiş satırlara dokunmaz; gerçekten tamamlananları döner.
+    """
+    if not product_ids:
+        return []
+    completed = [
+        r[0] for r in db.execute(
+            update(Product)
+            .where(Product.id.in_(product_ids), Product.lease_owner == worker_id)
+            .values(lease_owner=None, lease_expires_at=None, last_run_id=run_id)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    ]
+    db.commit()
+    return completed
+
+
+def release(db, worker_id: str, product_ids: list[int]) -> None:
+    # İşlenemeyen ürünleri (hata/kesinti) başka worker alabilsin diye bırak.
+    if not product_ids:
+        return
+    db.execute(
+        update(Product)
+        .where(Product.id.in_(product_ids), Product.lease_owner == worker_id)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def run_summary(db, run_id: str) -> dict:
+    """Tüm worker'ların (süreç/host) sonuçlarını tek özet halinde toplar."""
+    row = db.execute(
+        select(
+            func.count(WorkerRun.id),
+            func.coalesce(func.sum(WorkerRun.processed), 0),
+            func.coalesce(func.sum(WorkerRun.skipped), 0),
+            func.coalesce(func.sum(WorkerRun.pass_count), 0),
+            func.coalesce(func.sum(WorkerRun.fail_count), 0),
+            func.coalesce(func.sum(WorkerRun.deferred), 0),
+            func.min(WorkerRun.started_at),
+            func.max(WorkerRun.finished_at),
+        ).where(WorkerRun.run_id == run_id)
+    ).one()
+    workers, processed, skipped, passed, failed, deferred, started, finished = row
+    out = {
+        "run_id": run_id,
+        "workers": int(workers),
+        "processed": int(processed),
+        "skipped": int(skipped),
+        "pass": int(passed),
+        "fail": int(failed),
+        "deferred": int(deferred),
+    }
+    if started and finished:
+        elapsed = (finished - started).total_seconds()
+        out["elapsed_s"] = round(elapsed, 2)
+        out["products_per_s"] = round(out["processed"] / elapsed, 3) if elapsed > 0 else None
+
+    # Token / maliyet: run'ın Generation satırlarından, modele göre
+    usage = db.execute(
+        select(
+            Generation.model_name,
+            func.count(Generation.id),
+            func.coalesce(func.sum(Generation.input_tokens), 0),
+            func.coalesce(func.sum(Generation.output_tokens), 0),
+            func.coalesce(func.sum(Generation.cached_tokens), 0),
+            func.coalesce(func.sum(Generation.retry_count), 0),
+            func.count(Generation.fallback_reason),
+        )
+        .where(Generation.run_id == run_id)
+        .group_by(Generation.model_name)
+    ).all()
+    cost = 0.0
+    models = {}
+    for model, n, in_tok, out_tok, cached, retries, fallbacks in usage:
+        c = estimate_cost(model, int(in_tok), int(out_tok), int(cached))
+        cost += c
+        models[model or "?"] = {
+            "generations": int(n),
+            "input_tokens": int(in_tok),
+            "output_tokens": int(out_tok),
+            "cached_tokens": int(cached),
+            "retries": int(retries),
+            "fallbacks": int(fallbacks),
+            "cost_usd": round(c, 4),
+        }
+    out["models"] = models
+
+    # Kademe başına geçme oranı / gecikme / maliyet (yönlendirme kararlarının girdisi)
+    tiers = {}
+    for tier, status, n, lat, in_tok, out_tok, cached, model in db.execute(
+        select(
+            Generation.tier,
+            Generation.status,
+            func.count(Generation.id),
+            func.coalesce(func.sum(Generation.latency_ms), 0),
+            func.coalesce(func.sum(Generation.input_tokens), 0),
+            func.coalesce(func.sum(Generation.output_tokens), 0),
+            func.coalesce(func.sum(Generation.cached_tokens), 0),
+            Generation.model_name,
+        )
+        .where(Generation.run_id == run_id, Generation.tier.is_not(None))
+        .group_by(Generation.tier, Generation.status, Generation.model_name)
+    ).all():
+        t = tiers.setdefault(tier, {"generations": 0, "pass": 0, "latency_ms": 0, "cost_usd": 0.0})
+        t["generations"] += int(n)
+        t["pass"] += int(n) if status == "PASS" else 0
+        t["latency_ms"] += int(lat)
+        t["cost_usd"] += estimate_cost(model, int(in_tok), int(out_tok), int(cached))
+    out["tiers"] = {
+        tier: {
+            "generations": t["generations"],
+            "pass_rate": round(t["pass"] / t["generations"], 3),
+            "avg_latency_ms": round(t["latency_ms"] / t["generations"]),
+            "cost_usd": round(t["cost_usd"], 4),
+        }
+        for tier, t in tiers.items()
+    }
+    # Uzunluk denetimi: uzatma çağrısı oranı ve kırpmada atılan çıktı
+    n_llm, expanded, truncated = db.execute(
+        select(
+            func.count(Generation.id),
+            func.count(Generation.id).filter(Generation.expansion_calls > 0),
+            func.coalesce(func.sum(Generation.truncated_chars), 0),
+        ).where(Generation.run_id == run_id, Generation.fallback_reason.is_(None), Generation.output_tokens > 0)
+    ).one()
+    out["length"] = {
+        "llm_generations": int(n_llm),
+        "expansion_rate": round(expanded / n_llm, 3) if n_llm else None,
+        "truncated_chars": int(truncated),
+    }
+    # Yeniden deneme kuyruğu (run'dan bağımsız, anlık durum): durum -> hata sınıfı -> ürün sayısı
+    out["queue"] = queue_summary(db)
+    out["cost_usd"] = round(cost, 4)
+    out["cost_per_1k_products_usd"] = round(cost / out["processed"] * 1000, 4) if out["processed"] else None
+    return out
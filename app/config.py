@@ -1,3 +1,4 @@
+import json
 import os
 from pydantic import BaseModel
 
@@ -7,5 +8,91 @@ class Settings(BaseModel):
     max_chars: int = int(os.getenv("MAX_CHARS", "27000"))
     inline_images: bool = os.getenv("INLINE_IMAGES", "false").lower() == "true"
     banned_words_path: str = os.getenv("BANNED_WORDS_PATH", "data/banned_words.txt")
+    # Çıktıda izin verilen HTML etiketleri (img: stub görsel bloğu için)
+    allowed_tags: list[str] = os.getenv("ALLOWED_TAGS", "strong,ul,li,br,img").split(",")
+
+    # SQLite profili (eşzamanlı worker'lar için)
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_cache_size_kb: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+    # Postgres vb. sunucu veritabanları için bağlantı havuzu
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+    # Tek yazıcı kuyruğu: kaç Generation bir transaction'da toplanır
+    writer_batch_size: int = int(os.getenv("WRITER_BATCH_SIZE", "50"))
+    writer_flush_interval: float = float(os.getenv("WRITER_FLUSH_INTERVAL", "1.0"))
+
+    # Çoklu worker: lease süresi ve tek seferde sahiplenilen ürün sayısı
+    lease_seconds: int = int(os.getenv("LEASE_SECONDS", "600"))
+    claim_batch_size: int = int(os.getenv("CLAIM_BATCH_SIZE", "20"))
+
+    # Önceliklendirme sinyalleri (yüksek skor önce işlenir)
+    priority_weight_missing_desc: float = float(os.getenv("PRIORITY_WEIGHT_MISSING_DESC", "3.0"))
+    priority_weight_short_desc: float = float(os.getenv("PRIORITY_WEIGHT_SHORT_DESC", "1.5"))
+    priority_short_desc_chars: int = int(os.getenv("PRIORITY_SHORT_DESC_CHARS", "300"))
+    priority_weight_recent: float = float(os.getenv("PRIORITY_WEIGHT_RECENT", "1.0"))
+    priority_recent_days: int = int(os.getenv("PRIORITY_RECENT_DAYS", "7"))
+    priority_weight_fail: float = float(os.getenv("PRIORITY_WEIGHT_FAIL", "0.5"))
+    # {"Giyim > Spor": 2.0, "Ev": 0.5} — en uzun eşleşen kategori öneki kullanılır
+    priority_category_weights: dict[str, float] = json.loads(os.getenv("PRIORITY_CATEGORY_WEIGHTS", "{}"))
+
+    # Kategori adaleti: kategori anahtarı derinliği, sabit kotalar ve run içi azami pay
+    category_depth: int = int(os.getenv("CATEGORY_DEPTH", "1"))
+    category_quotas: dict[str, int] = json.loads(os.getenv("CATEGORY_QUOTAS", "{}"))
+    category_max_share: float = float(os.getenv("CATEGORY_MAX_SHARE", "1.0"))
+    fairness_weight: float = float(os.getenv("FAIRNESS_WEIGHT", "1.0"))
+
+    # Run başına bütçe (0 = sınırsız); tahmin için geçmiş yoksa ürün başı token varsayımı
+    run_token_budget: int = int(os.getenv("RUN_TOKEN_BUDGET", "0"))
+    run_cost_budget_usd: float = float(os.getenv("RUN_COST_BUDGET_USD", "0"))
+    est_tokens_per_product: int = int(os.getenv("EST_TOKENS_PER_PRODUCT", "15000"))
+
+    # LLM çağrıları: zaman aşımı, circuit breaker, hedged request, run süre bütçesi
+    llm_timeout: float = float(os.getenv("LLM_TIMEOUT", "30"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "1"))
+    breaker_window: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    breaker_error_rate: float = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    breaker_open_seconds: float = float(os.getenv("BREAKER_OPEN_SECONDS", "60"))
+    breaker_sync_seconds: float = float(os.getenv("BREAKER_SYNC_SECONDS", "5"))
+    llm_hedge: bool = os.getenv("LLM_HEDGE", "false").lower() == "true"
+    llm_hedge_min_delay: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2.0"))
+    run_time_budget_s: float = float(os.getenv("RUN_TIME_BUDGET_S", "0"))
+
+    # Model kademeleri: ucuzdan güçlüye; doğrulamayı geçemeyen üretim bir üst kademeye taşınır
+    llm_tiers: list[str] = [m.strip() for m in os.getenv("LLM_TIERS", "gpt-4.1-nano,gpt-4.1-mini").split(",") if m.strip()]
+    # Kategori öneki -> kademe listesi, ör. {"Kozmetik": ["gpt-4.1-mini", "gpt-4.1"]}
+    llm_category_tiers: dict[str, list[str]] = json.loads(os.getenv("LLM_CATEGORY_TIERS", "{}"))
+    routing_stats_window: int = int(os.getenv("ROUTING_STATS_WINDOW", "2000"))
+    routing_min_samples: int = int(os.getenv("ROUTING_MIN_SAMPLES", "20"))
+    routing_prior_pass_rate: float = float(os.getenv("ROUTING_PRIOR_PASS_RATE", "0.8"))
+    routing_latency_usd_per_s: float = float(os.getenv("ROUTING_LATENCY_USD_PER_S", "0.0"))
+    routing_explore_rate: float = float(os.getenv("ROUTING_EXPLORE_RATE", "0.05"))
+
+    # Hedefli onarım: FAIL'de sadece sorunlu bloklar modele gönderilir
+    repair_max_rounds: int = int(os.getenv("REPAIR_MAX_ROUNDS", "2"))
+    repair_max_blocks: int = int(os.getenv("REPAIR_MAX_BLOCKS", "40"))
+
+    # Uzunluk denetimi: model/kategori başına öğrenilen karakter/çıktı token oranı
+    default_chars_per_token: float = float(os.getenv("DEFAULT_CHARS_PER_TOKEN", "3.0"))
+    length_min_samples: int = int(os.getenv("LENGTH_MIN_SAMPLES", "10"))
+    length_stats_window: int = int(os.getenv("LENGTH_STATS_WINDOW", "2000"))
+    length_token_headroom: float = float(os.getenv("LENGTH_TOKEN_HEADROOM", "1.05"))
+
+    # Görsel doğrulama: başarılı / başarısız kontrollerin önbellek süresi, eşzamanlılık
+    image_check_ttl_s: int = int(os.getenv("IMAGE_CHECK_TTL_S", str(7 * 24 * 3600)))
+    image_check_fail_ttl_s: int = int(os.getenv("IMAGE_CHECK_FAIL_TTL_S", str(24 * 3600)))
+    image_check_concurrency: int = int(os.getenv("IMAGE_CHECK_CONCURRENCY", "16"))
+    image_check_timeout: float = float(os.getenv("IMAGE_CHECK_TIMEOUT", "10"))
+
+    # FAIL yeniden deneme kuyruğu: azami deneme, üstel geri çekilme (saniye)
+    retry_max_attempts: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+    retry_backoff_base_s: int = int(os.getenv("RETRY_BACKOFF_BASE_S", "3600"))
+    retry_backoff_max_s: int = int(os.getenv("RETRY_BACKOFF_MAX_S", str(7 * 24 * 3600)))
 
 settings = Settings()
@@ -1,9 +1,110 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
 
-engine = create_engine(settings.db_url, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _set_sqlite_pragmas(dbapi_conn, _conn_record) -> None:
+    # Her yeni bağlantıda: WAL (okuyucular yazıcıyı beklemez), NORMAL fsync,
+    # büyük sayfa önbelleği ve mmap. busy_timeout kilitte hemen hata vermek yerine bekletir.
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cur.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")
+        cur.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cur.close()
+
+
+def build_engine(db_url: str | None = None) -> Engine:
+    """
+    - SQLite: WAL + pragma profili, busy timeout, thread'ler arası paylaşım.
+    - Diğerleri (Postgres): pool_size / max_overflow / pre_ping ile havuzlu engine.
+    """
+    url = db_url or settings.db_url
+    if _is_sqlite(url):
+        eng = create_engine(
+            url,
+            future=True,
+            connect_args={
+                "timeout": settings.sqlite_busy_timeout_ms / 1000.0,
+                "check_same_thread": False,
+            },
+        )
+        event.listen(eng, "connect", _set_sqlite_pragmas)
+        return eng
+
+    return create_engine(
+        url,
+        future=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+_engine: Engine | None = None
+
+
+def get_engine() -> Engine:
+    # Engine ilk kullanımda kurulur: import sırasında bağlantı/havuz maliyeti yok.
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+class _LazySessionMaker(sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionMaker(autoflush=False, autocommit=False, future=True)
+
+
+def __getattr__(name: str):
+    # Geriye uyumluluk: `from app.db import engine`
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
 
 class Base(DeclarativeBase):
     pass
+
+
+def _add_missing_columns(eng: Engine) -> None:
+    # Migration aracı yok: mevcut tablolara sonradan eklenen nullable kolonları ALTER ile ekle.
+    insp = inspect(eng)
+    existing_tables = set(insp.get_table_names())
+    with eng.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                col_type = col.type.compile(dialect=eng.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+
+
+def init_db() -> None:
+    # Tablolar yoksa oluştur (modeller import edilince Base.metadata'ya kaydolur).
+    from . import models  # noqa: F401
+
+    eng = get_engine()
+    Base.metadata.create_all(eng)
+    _add_missing_columns(eng)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import select, func, and_
+
+from .db import SessionLocal
+from .models import Product, Generation
+
+EXPORT_COLUMNS = [
+    "merchant_sku",
+    "barcode",
+    "title",
+    "brand",
+    "category_path",
+    "version",
+    "status",
+    "model_name",
+    "char_count",
+    "created_at",
+    "generated_html",
+]
+
+FORMATS = ("jsonl", "parquet", "xlsx")
+
+
+def _filters(status: str | None, version: int | None, since: datetime | None, until: datetime | None) -> list:
+    conds = []
+    if status:
+        conds.append(Generation.status == status)
+    if version is not None:
+        conds.append(Generation.version == version)
+    if since is not None:
+        conds.append(Generation.created_at >= since)
+    if until is not None:
+        conds.append(Generation.created_at < until)
+    return conds
+
+
+def iter_export_rows(
+    db,
+    status: str | None = "PASS",
+    version: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    latest_only: bool = True,
+    chunk_size: int = 500,
+) -> Iterator[tuple]:
+    """
+    Export satırlarını DB'den akış halinde verir (tablo belleğe alınmaz).
+    latest_only: filtreye uyan generation'lardan ürün başına en yüksek versiyon.
+    yield_per: Postgres'te sunucu taraflı cursor, SQLite'ta parça parça fetch.
+    """
+    conds = _filters(status, version, since, until)
+    q = (
+        select(
+            Product.merchant_sku,
+            Product.barcode,
+            Product.title,
+            Product.brand,
+            Product.category_path,
+            Generation.version,
+            Generation.status,
+            Generation.model_name,
+            Generation.char_count,
+            Generation.created_at,
+            Generation.generated_html,
+        )
+        .join(Product, Product.id == Generation.product_id)
+        .where(*conds)
+    )
+    if latest_only:
+        latest = (
+            select(Generation.product_id, func.max(Generation.version).label("v"))
+            .where(*conds)
+            .group_by(Generation.product_id)
+            .subquery()
+        )
+        q = q.join(latest, and_(latest.c.product_id == Generation.product_id, latest.c.v == Generation.version))
+    q = q.order_by(Generation.product_id, Generation.version).execution_options(yield_per=chunk_size)
+
+    for row in db.execute(q):
+        yield tuple(row)
+
+
+def _write_jsonl(rows: Iterator[tuple], path: str) -> int:
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            rec = dict(zip(EXPORT_COLUMNS, row))
+            rec["created_at"] = rec["created_at"].isoformat() if rec["created_at"] else None
+            f.write(json.dumps(rec, ensure_ascii=False))
+            f.write("\n")
+            n += 1
+    return n
+
+
+def _write_parquet(rows: Iterator[tuple], path: str, row_group_size: int) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:  # pragma: no cover
+        raise RuntimeError("Parquet export için pyarrow gerekli: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ("merchant_sku", pa.string()),
+        ("barcode", pa.string()),
+        ("title", pa.string()),
+        ("brand", pa.string()),
+        ("category_path", pa.string()),
+        ("version", pa.int32()),
+        ("status", pa.string()),
+        ("model_name", pa.string()),
+        ("char_count", pa.int32()),
+        ("created_at", pa.timestamp("us")),
+        ("generated_html", pa.large_string()),
+    ])
+
+    n = 0
+    buf: list[tuple] = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        def flush():
+            cols = list(zip(*buf))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema))
+            buf.clear()
+
+        # Her row group ayrı yazılır: bellekte en fazla row_group_size satır bulunur.
+        for row in rows:
+            buf.append(row)
+            n += 1
+            if len(buf) >= row_group_size:
+                flush()
+        if buf:
+            flush()
+    return n
+
+
+def _write_xlsx(rows: Iterator[tuple], path: str) -> int:
+    from openpyxl import Workbook
+
+    # write_only: satırlar diske akıtılır, hücre nesneleri bellekte tutulmaz.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("generations")
+    ws.append(EXPORT_COLUMNS)
+    n = 0
+    for row in rows:
+        ws.append(list(row))
+        n += 1
+    wb.save(path)
+    return n
+
+
+def export_generations(
+    out_path: str,
+    fmt: str | None = None,
+    status: str | None = "PASS",
+    version: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    latest_only: bool = True,
+    chunk_size: int = 500,
+    row_group_size: int = 1000,
+) -> dict:
+    """Generation'ları sabit bellekle JSONL / Parquet / XLSX'e yazar. Format verilmezse uzantıdan."""
+    fmt = (fmt or os.path.splitext(out_path)[1].lstrip(".")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Desteklenmeyen format: {fmt} (seçenekler: {', '.join(FORMATS)})")
+
+    out_dir = os.path.dirname(out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    with SessionLocal() as db:
+        rows = iter_export_rows(db, status, version, since, until, latest_only, chunk_size)
+        if fmt == "jsonl":
+            n = _write_jsonl(rows, out_path)
+        elif fmt == "parquet":
+            n = _write_parquet(rows, out_path, row_group_size)
+        else:
+            n = _write_xlsx(rows, out_path)
+
+    return {"exported": n, "path": out_path, "format": fmt}
@@ -1,26 +1,59 @@
 from __future__ import annotations
 
-import json
 import re
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
 from typing import Iterable
 
 from .config import settings
 from .llm_client import get_client
 from .generator_stub import generate_html as generate_html_stub
-
-# OpenAI SDK exception sınıfları sürüme göre farklı import edilebiliyor.
-try:
-    from openai import (
-        OpenAIError,
-        RateLimitError,
-        AuthenticationError,
-        APITimeoutError,
-        APIConnectionError,
-        BadRequestError,
-    )
-except Exception:  # pragma: no cover
-    from openai import OpenAIError  # type: ignore
-    RateLimitError = AuthenticationError = APITimeoutError = APIConnectionError = BadRequestError = OpenAIError  # type: ignore
+from .images import parse_image_urls as _parse_image_urls
+from .validator import PROTECTED_HEADING, protected_bounds, split_blocks, truncate_html
+from .length import LENGTH, LengthPlan
+from .metrics import METRICS, estimate_cost
+from .resilience import (
+    HALF_OPEN,
+    LLM_BREAKER,
+    LLM_LATENCY,
+    CircuitOpenError,
+    DeadlineExceeded,
+    HedgeTimeout,
+    hedged_call,
+    run_deadline,
+)
+
+_OPENAI_ERRORS: SimpleNamespace | None = None
+
+
+def _openai_errors() -> SimpleNamespace:
+    # OpenAI SDK exception sınıfları sürüme göre farklı import edilebiliyor.
+    # openai paketi ağır: ilk üretimde yüklenir, import anında değil.
+    global _OPENAI_ERRORS
+    if _OPENAI_ERRORS is None:
+        try:
+            from openai import (
+                OpenAIError,
+                RateLimitError,
+                AuthenticationError,
+                APITimeoutError,
+                APIConnectionError,
+                BadRequestError,
+            )
+        except Exception:  # pragma: no cover
+            from openai import OpenAIError  # type: ignore
+            RateLimitError = AuthenticationError = APITimeoutError = APIConnectionError = BadRequestError = OpenAIError  # type: ignore
+        _OPENAI_ERRORS = SimpleNamespace(
+            OpenAIError=OpenAIError,
+            RateLimitError=RateLimitError,
+            AuthenticationError=AuthenticationError,
+            APITimeoutError=APITimeoutError,
+            APIConnectionError=APIConnectionError,
+            BadRequestError=BadRequestError,
+        )
+    return _OPENAI_ERRORS
 
 
 def _strip_html_to_text(html: str) -> str:
@@ -34,35 +67,13 @@ def _safe_str(x) -> str:
     return str(x)
 
 
-def _parse_image_urls(image_urls_json: str | None) -> list[str]:
-    if not image_urls_json:
-        return []
-    s = image_urls_json.strip()
-    if not s:
-        return []
-    try:
-        data = json.loads(s)
-        if isinstance(data, list):
-            out = []
-            for u in data:
-                u = _safe_str(u).strip()
-                if u:
-                    out.append(u)
-            return out
-    except Exception:
-        pass
-    # CSV'den düz string geldiyse (tek url veya virgüllü)
-    if "," in s:
-        return [p.strip() for p in s.split(",") if p.strip()]
-    return [s]
-
-
 def _build_prompt(
     title: str,
     brand: str | None,
     category_path: str | None,
     old_description: str | None,
     image_urls: Iterable[str],
+    plan: LengthPlan | None = None,
 ) -> str:
     title = _safe_str(title).strip()
     brand = _safe_str(brand).strip()
@@ -88,6 +99,14 @@ def _build_prompt(
             f"<ul>{items}</ul><br/>"
         )
 
+    # Uzunluk hedefi token cinsinden de verilir (model karakteri değil token'ı sayar)
+    length_hint = ""
+    if plan is not None:
+        length_hint = (
+            f"\n- Aim for about {plan.target_chars} characters, which is roughly {plan.target_tokens} output tokens;"
+            " distribute the length evenly across the sections and finish the FAQ section completely."
+        )
+
     # LLM’in uyacağı tek HTML tag seti:
     # <strong>, <ul>, <li>, <br/>  (validator ile uyumlu)
     # Karakter hedefi: 25k–27k
@@ -104,7 +123,7 @@ HARD CONSTRAINTS:
 - Avoid exaggerated marketing language.
 - Do NOT repeat the same sentence or near-identical sentence structure.
 - Each paragraph must add NEW semantic information (no filler).
-- Total length MUST be between {settings.min_chars} and {settings.max_chars} characters.
+- Total length MUST be between {settings.min_chars} and {settings.max_chars} characters.{length_hint}
 
 CONTEXT:
 Product title: "{title}"
@@ -155,89 +174,367 @@ def _normalize_html(html: str) -> str:
     return html.strip()
 
 
-def generate_html_llm(
+@dataclass
+class GenerationMeta:
+    """
+    Tek ürün üretiminin ölçümleri (Generation satırına yazılır).
+    model: token harcayan son model (maliyet bundan hesaplanır); hiç çağrı yapılmadan stub'a
+    düşüldüyse "stub". Stub çıktısı olduğu fallback_reason'dan anlaşılır.
+    """
+    model: str = "stub"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    llm_calls: int = 0
+    latency_s: float = 0.0
+    fallback_reason: str | None = None
+    expansion_calls: int = 0
+    truncated_chars: int = 0
+    incomplete_calls: int = 0
+    calib_chars: int = 0
+    calib_tokens: int = 0
+    sealed: bool = False  # satırı yazıldı; sonradan biten hedge çağrıları _late_usage'a gider
+
+    @property
+    def retry_count(self) -> int:
+        # İlk çağrıdan sonraki ek çağrılar (uzatma düzeltmesi vb.)
+        return max(0, self.llm_calls - 1)
+
+
+# Ürün satırı yazıldıktan sonra biten (kaybeden) hedge çağrılarının kullanımı; run bütçesine
+# drain_late_usage ile eklenir.
+_usage_lock = threading.Lock()
+_late_usage = {"input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+
+def seal_meta(meta: GenerationMeta) -> None:
+    """meta Generation satırına yazılmak üzere: bundan sonraki kullanım meta'ya eklenmez."""
+    with _usage_lock:
+        meta.sealed = True
+
+
+def drain_late_usage() -> tuple[int, int, float]:
+    """Satırı yazıldıktan sonra biten hedge çağrılarının (girdi, çıktı token, maliyet) toplamı; sıfırlar."""
+    with _usage_lock:
+        out = (_late_usage["input_tokens"], _late_usage["output_tokens"], _late_usage["cost_usd"])
+        _late_usage.update(input_tokens=0, output_tokens=0, cost_usd=0.0)
+    return out
+
+
+def _request(client, model: str, prompt: str, timeout: float, max_output_tokens: int | None = None):
+    kwargs = {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+    return client.with_options(timeout=timeout).responses.create(
+        model=model,
+        input=[
+            {"role": "user", "content": [{"type": "input_text", "text": prompt}]}
+        ],
+        **kwargs,
+    )
+
+
+def _trim_incomplete(html: str) -> str:
+    """Token sınırında kesilen çıktı: yarım kalan son blok (etiket / cümle) atılır, açık <ul> kapatılır."""
+    blocks = split_blocks(html)
+    if len(blocks) > 1:
+        html = html[: blocks[-1][0]]
+    elif html.rfind("<") > html.rfind(">"):
+        html = html[: html.rfind("<")]
+    opened = html.count("<ul>") - html.count("</ul>")
+    return html + "</ul>" * max(opened, 0)
+
+
+def _record_usage(meta: GenerationMeta, resp, model: str, latency: float) -> tuple[int, str]:
+    """Yanıtın token kullanımını meta'ya (satırı yazıldıysa _late_usage'a) ve METRICS'e ekler."""
+    usage = getattr(resp, "usage", None)
+    in_tok = int(getattr(usage, "input_tokens", 0) or 0)
+    out_tok = int(getattr(usage, "output_tokens", 0) or 0)
+    details = getattr(usage, "input_tokens_details", None)
+    cached = int(getattr(details, "cached_tokens", 0) or 0)
+    billed = getattr(resp, "model", None) or model
+
+    with _usage_lock:
+        if meta.sealed:
+            _late_usage["input_tokens"] += in_tok
+            _late_usage["output_tokens"] += out_tok
+            _late_usage["cost_usd"] += estimate_cost(billed, in_tok, out_tok, cached)
+        else:
+            meta.model = billed
+            meta.input_tokens += in_tok
+            meta.output_tokens += out_tok
+            meta.cached_tokens += cached
+            meta.llm_calls += 1
+    METRICS.record_llm_call(billed, latency, in_tok, out_tok, cached)
+    return out_tok, billed
+
+
+def _call_llm(
+    client,
+    model: str,
+    prompt: str,
+    meta: GenerationMeta,
+    max_output_tokens: int | None = None,
+    calibrate: bool = False,
+) -> str:
+    """
+    Tek LLM çağrısı; circuit breaker, run süre bütçesinden türetilen zaman aşımı ve
+    (LLM_HEDGE=true ise) p95 gecikmesinden sonra başlatılan hedge çağrısı ile.
+    calibrate: çıktı uzunluğu karakter/token kalibrasyonuna sayılsın (sadece tamamlanmışsa).
+    """
+    # Süre bütçesi deneme hakkı alınmadan kontrol edilir (DeadlineExceeded hakkı sızdırmasın)
+    timeout = run_deadline().call_timeout()
+    if not LLM_BREAKER.allow():
+        METRICS.inc("llm_circuit_rejected_total", help="Devre açıkken yapılmayan çağrılar")
+        raise CircuitOpenError("llm circuit open")
+
+    t0 = time.perf_counter()
+
+    def on_discard(fut) -> None:
+        # Sonucu kullanılmayan hedge çağrısı: token'ları sayılır, sonucu devreye yansır
+        exc = fut.exception()
+        if exc is None:
+            LLM_BREAKER.record_success()
+            _record_usage(meta, fut.result(), model, time.perf_counter() - t0)
+        elif not isinstance(exc, _openai_errors().BadRequestError):
+            LLM_BREAKER.record_failure()
+
+    recorded = False
+    try:
+        # HALF_OPEN'da tek deneme çağrısı yapılır; hedge ikinci bir istek gönderirdi
+        if settings.llm_hedge and LLM_BREAKER.state != HALF_OPEN:
+            resp = hedged_call(
+                lambda: _request(client, model, prompt, timeout, max_output_tokens),
+                delay=min(LLM_LATENCY.hedge_delay(), timeout),
+                timeout=timeout,
+                on_discard=on_discard,
+            )
+        else:
+            resp = _request(client, model, prompt, timeout, max_output_tokens)
+    except _openai_errors().BadRequestError:
+        # İstek hatası servis sağlığıyla ilgili değil: devreyi etkilemez (deneme hakkı finally'de iade)
+        raise
+    except Exception:
+        LLM_BREAKER.record_failure()
+        recorded = True
+        raise
+    else:
+        latency = time.perf_counter() - t0
+        LLM_BREAKER.record_success()
+        recorded = True
+    finally:
+        if not recorded:
+            # HALF_OPEN deneme hakkı hiçbir çıkış yolunda asılı kalmasın
+            LLM_BREAKER.release_probe()
+    LLM_LATENCY.observe(latency)
+    out_tok, _ = _record_usage(meta, resp, model, latency)
+
+    html = _normalize_html(getattr(resp, "output_text", "") or "")
+    if getattr(resp, "status", None) == "incomplete":
+        # max_output_tokens'a takıldı: uzunluğu doğal değil, kalibrasyona girmez
+        meta.incomplete_calls += 1
+        METRICS.inc("llm_incomplete_total", help="Token sınırında kesilen LLM yanıtları", model=model)
+        return _trim_incomplete(html)
+    if calibrate and out_tok:
+        meta.calib_chars += len(html)
+        meta.calib_tokens += out_tok
+    return html
+
+
+def _mark_protected_end(html: str, old_description: str | None) -> str:
+    """
+    Eski açıklama bölümünün sonu "Yeni ..." başlığıyla kesinleşir; model başlığı atladıysa
+    aynen kopyalanmış eski açıklamanın hemen ardına eklenir (onarım / kırpma sınırı kaymasın).
+    """
+    old = _safe_str(old_description).strip()
+    if not old or protected_bounds(html)[1]:
+        return html
+    start = html.find(f"<strong>{PROTECTED_HEADING}</strong>")
+    i = html.find(old, start) if start >= 0 else -1
+    if i < 0:
+        return html
+    end = i + len(old)
+    while html.startswith("<br/>", end):
+        end += len("<br/>")
+    return html[:end] + "<strong>Yeni SEO Açıklaması</strong><br/>" + html[end:]
+
+
+def _insert_before_images(html: str, addition: str) -> str:
+    # Görsel bölümü her zaman en sonda kalsın
+    i = html.find("<strong>Ürün Görselleri")
+    if i < 0:
+        return html + addition
+    return html[:i] + addition + html[i:]
+
+
+def _fallback(meta: GenerationMeta, reason: str, title, brand, category_path, old_description, image_urls_json):
+    meta.fallback_reason = reason
+    if not meta.llm_calls:
+        # Uzatma / onarım adımında düşüldüyse harcanan token'lar gerçek modelden faturalanır
+        meta.model = "stub"
+    METRICS.inc("llm_fallback_total", help="Stub'a düşen üretimler", reason=reason)
+    return generate_html_stub(title, brand, category_path, old_description, image_urls_json)
+
+
+def generate_html_llm_with_meta(
     title: str,
     brand: str | None,
     category_path: str | None,
     old_description: str | None,
     image_urls_json: str | None = None,
     model: str | None = None,
-) -> str:
+) -> tuple[str, GenerationMeta]:
     """
-    LLM ile HTML üretir.
-    - Quota / auth / rate-limit gibi hatalarda stub generator'a düşer (sistem bozulmasın diye).
+    LLM ile HTML üretir; (html, ölçümler) döner.
+    - Quota / auth / rate-limit gibi hatalarda stub generator'a düşer (sistem bozulmasın diye),
+      sebebi meta.fallback_reason'a yazılır.
     - settings.min_chars / settings.max_chars aralığını hedefler.
     """
-    image_urls = _parse_image_urls(image_urls_json)
-
-    prompt = _build_prompt(
-        title=title,
-        brand=brand,
-        category_path=category_path,
-        old_description=old_description,
-        image_urls=image_urls,
-    )
+    meta = GenerationMeta()
+    t_start = time.perf_counter()
+    fallback_args = (title, brand, category_path, old_description, image_urls_json)
+
+    use_model = model or (settings.llm_tiers[-1] if settings.llm_tiers else "gpt-4.1-mini")
+
+    with METRICS.stage("prompt_build"):
+        image_urls = _parse_image_urls(image_urls_json)
+        plan = LENGTH.plan(use_model, category_path)
+
+        prompt = _build_prompt(
+            title=title,
+            brand=brand,
+            category_path=category_path,
+            old_description=old_description,
+            image_urls=image_urls,
+            plan=plan,
+        )
+
+    # Devre açıksa istemci / openai hiç yüklenmeden stub
+    if LLM_BREAKER.is_open():
+        METRICS.inc("llm_circuit_rejected_total", help="Devre açıkken yapılmayan çağrılar")
+        html = _fallback(meta, "circuit_open", *fallback_args)
+        meta.latency_s = time.perf_counter() - t_start
+        return html, meta
 
     client = get_client()
-    use_model = model or getattr(settings, "llm_model", None) or "gpt-4.1-mini"
+    errs = _openai_errors()
 
     # 2 deneme: ilk üretim + gerekirse “uzat ama tekrar etme” düzeltmesi
     # (Validator zaten son sözü söyleyecek; burada sadece hedef aralığına yaklaşmaya çalışıyoruz.)
     try:
-        resp = client.responses.create(
-            model=use_model,
-            input=[
-                {"role": "user", "content": [{"type": "input_text", "text": prompt}]}
-            ],
-        )
-        html = _normalize_html(getattr(resp, "output_text", "") or "")
+        html = _call_llm(client, use_model, prompt, meta, max_output_tokens=plan.max_output_tokens, calibrate=True)
         if not html:
             # Boş döndüyse stub’a düş.
-            return generate_html_stub(title, brand, category_path, old_description, image_urls_json)
+            html = _fallback(meta, "empty_output", *fallback_args)
+            meta.latency_s = time.perf_counter() - t_start
+            return html, meta
+        html = _mark_protected_end(html, old_description)
 
-        # Çok kısa kaldıysa bir kez “genişlet” iste.
+        # Çok kısa kaldıysa bir kez “genişlet” iste: belgenin tamamı değil, sadece mevcut
+        # başlıklar gönderilir; model eklenecek yeni bölümleri döner, görsellerden önce eklenir.
         if len(html) < settings.min_chars:
             delta = settings.min_chars - len(html)
+            headings = re.findall(r"<strong>(.*?)</strong>", html)
             fix_prompt = f"""
-You previously generated HTML but it is too short by approximately {delta} characters.
+You previously generated an HTML product description that is too short by approximately {delta} characters.
+Product title: "{_safe_str(title).strip()}"  Category path: "{_safe_str(category_path).strip()}"
+
+EXISTING SECTION HEADINGS (already written, do NOT repeat them or their content):
+{chr(10).join("- " + h for h in headings)}
 
 RULES:
-- Keep the existing HTML exactly as-is at the beginning.
-- Append NEW sections and NEW sentences only (no repetition).
+- Return ONLY the NEW HTML to append (about {delta + 500} characters), nothing from the existing text.
+- Add new sections / sentences with new information only (no repetition).
 - Use ONLY <strong>, <ul>, <li>, <br/> tags.
 - Do NOT use banned words.
-- Reach total length between {settings.min_chars} and {settings.max_chars} characters.
-
-EXISTING HTML (DO NOT EDIT, ONLY APPEND):
-{html}
-
-Now append new, non-repetitive content to reach the target length.
 """.strip()
 
-            resp2 = client.responses.create(
-                model=use_model,
-                input=[
-                    {"role": "user", "content": [{"type": "input_text", "text": fix_prompt}]}
-                ],
+            meta.expansion_calls += 1
+            METRICS.inc("llm_expansion_calls_total", help="Kısa kalan çıktı için uzatma çağrıları", model=use_model)
+            addition = _call_llm(
+                client, use_model, fix_prompt, meta,
+                max_output_tokens=int(plan.tokens_for(delta + 500) * settings.length_token_headroom),
+                calibrate=True,
             )
-            html2 = _normalize_html(getattr(resp2, "output_text", "") or "")
-            if html2:
-                html = html2
+            if addition:
+                html = _insert_before_images(html, addition)
 
-        # Fazla uzunsa güvenli kırp (validator max_chars kontrolü var)
+        # Fazla uzunsa blok sınırında kırp; atılan kısım boşa giden token olarak sayılır
         if len(html) > settings.max_chars:
-            html = html[: settings.max_chars - 3] + "..."
+            before = len(html)
+            html = truncate_html(html, settings.max_chars)
+            meta.truncated_chars = before - len(html)
+            METRICS.inc(
+                "llm_wasted_output_tokens_total",
+                plan.tokens_for(meta.truncated_chars),
+                help="Kırpmada atılan çıktının tahmini token karşılığı",
+                model=use_model,
+            )
 
-        return html
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        # Devre çağrılar arasında açıldı / run süre bütçesi doldu
+        reason = "circuit_open" if isinstance(e, CircuitOpenError) else "deadline"
+        html = _fallback(meta, reason, *fallback_args)
 
-    except (RateLimitError, AuthenticationError) as e:
+    except (errs.RateLimitError, errs.AuthenticationError) as e:
         # RateLimit: quota/429 vb. — demo/production için stub’a düşmek mantıklı.
-        return generate_html_stub(title, brand, category_path, old_description, image_urls_json)
+        reason = "rate_limit" if isinstance(e, errs.RateLimitError) else "auth"
+        html = _fallback(meta, reason, *fallback_args)
 
-    except (APITimeoutError, APIConnectionError) as e:
-        # Bağlantı sorunları: stub
-        return generate_html_stub(title, brand, category_path, old_description, image_urls_json)
+    except (errs.APITimeoutError, errs.APIConnectionError, HedgeTimeout) as e:
+        # Bağlantı sorunları (hedge'li çağrının zaman aşımı dahil): stub
+        reason = "timeout" if isinstance(e, (errs.APITimeoutError, HedgeTimeout)) else "connection"
+        html = _fallback(meta, reason, *fallback_args)
 
-    except (BadRequestError, OpenAIError) as e:
+    except (errs.BadRequestError, errs.OpenAIError) as e:
         # Prompt hatası vs. — yine stub (pipeline kırılmasın)
-        return generate_html_stub(title, brand, category_path, old_description, image_urls_json)
+        reason = "bad_request" if isinstance(e, errs.BadRequestError) else "api_error"
+        html = _fallback(meta, reason, *fallback_args)
+
+    meta.latency_s = time.perf_counter() - t_start
+    return html, meta
+
+
+def repair_html_llm(
+    html: str,
+    vr,
+    validator,
+    model: str | None,
+    meta: GenerationMeta,
+) -> tuple[str, object]:
+    """
+    FAIL olan LLM çıktısını hedefli onarır (app.repair): sadece sorunlu bloklar aynı modele
+    gönderilir. Token / çağrı sayıları meta'ya eklenir. Model hatasında eldeki en iyi sonuç döner.
+    """
+    from .repair import repair_html
+
+    t0 = time.perf_counter()
+    client = get_client()
+    use_model = model or (settings.llm_tiers[-1] if settings.llm_tiers else "gpt-4.1-mini")
+    try:
+        with METRICS.stage("repair"):
+            new_html, new_vr, stats = repair_html(
+                html, vr, validator, lambda prompt: _call_llm(client, use_model, prompt, meta)
+            )
+    except Exception:
+        # Devre açık / zaman aşımı vb.: onarımsız devam (kademe yükseltmesi karar verir)
+        METRICS.inc("llm_repairs_total", help="Hedefli onarım sonuçları", result="error")
+        meta.latency_s += time.perf_counter() - t0
+        return html, vr
+    METRICS.inc("llm_repairs_total", help="Hedefli onarım sonuçları", result="fixed" if new_vr.ok else "failed")
+    METRICS.inc("repair_blocks_total", stats.blocks_sent, help="Onarım için modele gönderilen bloklar")
+    meta.latency_s += time.perf_counter() - t0
+    return new_html, new_vr
+
+
+def generate_html_llm(
+    title: str,
+    brand: str | None,
+    category_path: str | None,
+    old_description: str | None,
+    image_urls_json: str | None = None,
+    model: str | None = None,
+) -> str:
+    """Geriye uyumlu arayüz: sadece HTML döner (ölçümler için generate_html_llm_with_meta)."""
+    html, _ = generate_html_llm_with_meta(
+        title, brand, category_path, old_description, image_urls_json, model=model
+    )
+    return html
@@ -1,47 +1,13 @@
 # app/generator_stub.py
 from __future__ import annotations
 
-import json
 import re
 from html import escape
 from typing import Any
 
 from .config import settings
-
-
-def _parse_image_urls(image_urls_json: str | None) -> list[str]:
-    """
-    image_urls_json:
-      - "[]" (string)
-      - ["url1","url2"] (json string)
-      - "url1|url2|url3" (legacy)
-      - "" / None
-    """
-    if not image_urls_json:
-        return []
-    raw = str(image_urls_json).strip()
-    if not raw:
-        return []
-
-    # JSON list case
-    if raw.startswith("["):
-        try:
-            arr = json.loads(raw)
-            if isinstance(arr, list):
-                urls = [str(u).strip() for u in arr if str(u).strip()]
-                return urls
-        except Exception:
-            pass
-
-    # delimited case
-    if "|" in raw:
-        return [u.strip() for u in raw.split("|") if u.strip()]
-
-    # single url
-    if raw.startswith("http"):
-        return [raw]
-
-    return []
+from .images import parse_image_urls as _parse_image_urls
+from .validator import truncate_html
 
 
 def _strip_html(text: str) -> str:
@@ -221,9 +187,9 @@ def generate_html_stub(
         html += _safe_text(filler_sentences[i]) + "<br/>"
         i += 1
 
-    # 6) Max karakteri aşma (gerekirse kırp)
+    # 6) Max karakteri aşma (gerekirse blok sınırında kırp)
     if len(html) > settings.max_chars:
-        html = html[: settings.max_chars - 3] + "..."
+        html = truncate_html(html, settings.max_chars)
 
     return html
 # Backward-compat: eski importlar generate_html arıyorsa kırılmasın
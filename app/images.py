@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from .config import settings
+from .metrics import METRICS
+
+# --- Kanonik biçim ---
+# Ürünün görselleri DB'de tek biçimde tutulur: image_urls_json = JSON liste, her öğe
+# normalize edilmiş http(s) URL'i. Ingest bu biçime çevirir; üreticiler sadece bunu okur.
+
+
+def normalize_url(url: str) -> str | None:
+    u = str(url or "").strip()
+    if not u:
+        return None
+    if u.startswith("//"):
+        u = "https:" + u
+    parts = urlsplit(u)
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+        return None
+    path = quote(parts.path, safe="/%:@!$&'()*+,;=-._~")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def parse_image_urls(raw: str | None) -> list[str]:
+    """
+    Kabul edilen girdiler: JSON liste, "a|b|c" (eski CSV), "a,b" ya da tek URL.
+    Döner: normalize edilmiş, tekrarsız URL listesi (sıra korunur).
+    """
+    if not raw:
+        return []
+    s = str(raw).strip()
+    if not s:
+        return []
+    items: list[str] | None = None
+    if s.startswith("["):
+        try:
+            data = json.loads(s)
+            if isinstance(data, list):
+                items = [str(u) for u in data if u is not None]
+        except ValueError:
+            pass
+    if items is None:
+        if "|" in s:
+            items = s.split("|")
+        else:
+            # Virgül URL içinde de geçebilir: sadece ardından yeni bir URL başlıyorsa ayır
+            items = re.split(r",\s*(?=https?://|//)", s)
+
+    out, seen = [], set()
+    for u in items:
+        n = normalize_url(u)
+        if n and n not in seen:
+            seen.add(n)
+            out.append(n)
+    return out
+
+
+def canonical_image_urls_json(raw: str | None) -> str | None:
+    urls = parse_image_urls(raw)
+    return json.dumps(urls, ensure_ascii=False) if urls else None
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+# --- Doğrulama ---
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Görsel sunucuları için bağlantı havuzlu session (Trendyol API session'ından ayrı, auth yok)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                s = requests.Session()
+                retry = Retry(
+                    total=2,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=frozenset(["HEAD", "GET"]),
+                )
+                n = settings.image_check_concurrency
+                adapter = HTTPAdapter(pool_connections=n, pool_maxsize=n, max_retries=retry)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update({"User-Agent": "seo-ai-image-check/1.0"})
+                _session = s
+    return _session
+
+
+def check_url(url: str) -> dict:
+    """HEAD; sunucu HEAD'i desteklemiyorsa tek baytlık ranged GET. ok: 2xx/3xx ve image/* içerik."""
+    s = _get_session()
+    timeout = settings.image_check_timeout
+    t0 = time.perf_counter()
+    try:
+        r = s.head(url, allow_redirects=True, timeout=timeout)
+        if r.status_code in (403, 405, 501):
+            r = s.get(url, allow_redirects=True, timeout=timeout, stream=True, headers={"Range": "bytes=0-0"})
+            r.close()
+        ctype = (r.headers.get("Content-Type") or "").split(";")[0].strip().lower() or None
+        size = r.headers.get("Content-Length")
+        if r.status_code == 206:
+            size = (r.headers.get("Content-Range") or "").rpartition("/")[2] or None
+        res = {
+            "status_code": r.status_code,
+            "content_type": ctype,
+            "content_length": int(size) if size and str(size).isdigit() else None,
+            "ok": r.status_code < 400 and bool(ctype and ctype.startswith("image/")),
+            "error": None,
+        }
+    except Exception as e:
+        res = {"status_code": None, "content_type": None, "content_length": None, "ok": False,
+               "error": f"{type(e).__name__}: {e}"[:255]}
+    METRICS.observe("image_check_seconds", time.perf_counter() - t0, help="Görsel URL kontrol süresi")
+    METRICS.inc("image_checks_total", help="Görsel URL kontrolleri", ok=str(res["ok"]).lower())
+    return res
+
+
+def _all_product_urls(db) -> list[str]:
+    from sqlalchemy import select
+
+    from .models import Product
+
+    urls, seen = [], set()
+    q = select(Product.image_urls_json).where(Product.image_urls_json.is_not(None)).execution_options(yield_per=1000)
+    for (raw,) in db.execute(q):
+        for u in parse_image_urls(raw):
+            if u not in seen:
+                seen.add(u)
+                urls.append(u)
+    return urls
+
+
+def _fresh_hashes(db, hashes: list[str], now: datetime) -> set[str]:
+    from sqlalchemy import select
+
+    from .models import ImageCheck
+
+    fresh: set[str] = set()
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        fresh.update(
+            h for (h,) in db.execute(
+                select(ImageCheck.url_hash).where(ImageCheck.url_hash.in_(chunk), ImageCheck.expires_at > now)
+            )
+        )
+    return fresh
+
+
+def _check_and_store(db, urls: list[str], concurrency: int | None = None) -> set[str]:
+    """URL'leri eşzamanlı kontrol eder, sonuçları image_checks'e yazar (TTL ile); ok olanların hash'lerini döner."""
+    from .models import ImageCheck
+
+    ok: set[str] = set()
+    if not urls:
+        return ok
+    with ThreadPoolExecutor(max_workers=concurrency or settings.image_check_concurrency) as ex:
+        futures = {ex.submit(check_url, u): u for u in urls}
+        for n, fut in enumerate(as_completed(futures), 1):
+            u = futures[fut]
+            res = fut.result()
+            checked = datetime.utcnow()
+            ttl = settings.image_check_ttl_s if res["ok"] else settings.image_check_fail_ttl_s
+            db.merge(ImageCheck(
+                url_hash=url_hash(u), url=u, checked_at=checked,
+                expires_at=checked + timedelta(seconds=ttl), **res,
+            ))
+            if res["ok"]:
+                ok.add(url_hash(u))
+            if n % 200 == 0:
+                db.commit()
+    db.commit()
+    return ok
+
+
+def verify_images(limit: int | None = None, concurrency: int | None = None, force: bool = False) -> dict:
+    """
+    Ürünlerdeki tüm tekil görsel URL'lerini eşzamanlı kontrol eder; süresi dolmamış
+    önbellek kaydı olanlar atlanır (force hariç). Sonuçlar image_checks tablosuna yazılır.
+    """
+    from .db import SessionLocal
+
+    now = datetime.utcnow()
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        urls = _all_product_urls(db)
+        fresh = set() if force else _fresh_hashes(db, [url_hash(u) for u in urls], now)
+        todo = [u for u in urls if url_hash(u) not in fresh]
+        if limit is not None:
+            todo = todo[:limit]
+        ok = _check_and_store(db, todo, concurrency)
+
+    stats = {
+        "urls": len(urls), "cached": len(urls) - len(todo), "checked": len(todo),
+        "ok": len(ok), "broken": len(todo) - len(ok),
+        "elapsed_s": round(time.perf_counter() - t0, 2),
+    }
+    return stats
+
+
+def _ok_hashes(db, hashes: list[str], now: datetime) -> set[str]:
+    from sqlalchemy import select
+
+    from .models import ImageCheck
+
+    ok: set[str] = set()
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        ok.update(
+            h for (h,) in db.execute(
+                select(ImageCheck.url_hash).where(
+                    ImageCheck.url_hash.in_(chunk),
+                    ImageCheck.ok.is_(True),
+                    ImageCheck.expires_at > now,
+                )
+            )
+        )
+    return ok
+
+
+def verified_image_map(db, raw_by_id: dict[int, str | None]) -> dict[int, str | None]:
+    """
+    Birden çok ürün için tek seferde: ürün id -> sadece doğrulanmış (ok, süresi dolmamış)
+    görsellerin JSON listesi; hiç yoksa None.
+    Önbellekte hiç ya da süresi dolmuş kaydı olan URL'ler burada kontrol edilip önbelleğe yazılır
+    (ayrı kısa session'da; çağıranın okuma session'ı yazma kilidi almasın). Böylece
+    `verify-images` çalıştırılmadıysa ya da TTL dolduysa görseller sessizce düşmez.
+    """
+    from .db import SessionLocal
+
+    urls_by_id = {pid: parse_image_urls(raw) for pid, raw in raw_by_id.items()}
+    by_hash = {url_hash(u): u for urls in urls_by_id.values() for u in urls}
+    hashes = sorted(by_hash)
+    now = datetime.utcnow()
+    ok = _ok_hashes(db, hashes, now) if hashes else set()
+    not_ok = [h for h in hashes if h not in ok]
+    fresh = _fresh_hashes(db, not_ok, now) if not_ok else set()
+    stale = [by_hash[h] for h in not_ok if h not in fresh]
+    if stale:
+        METRICS.inc("images_checked_inline_total", len(stale), help="Üretim sırasında doğrulanan (önbellekte olmayan) görseller")
+        with SessionLocal() as wdb:
+            ok |= _check_and_store(wdb, stale)
+
+    out: dict[int, str | None] = {}
+    dropped = 0
+    for pid, urls in urls_by_id.items():
+        kept = [u for u in urls if url_hash(u) in ok]
+        dropped += len(urls) - len(kept)
+        out[pid] = json.dumps(kept, ensure_ascii=False) if kept else None
+    if dropped:
+        METRICS.inc("images_dropped_total", dropped, help="Doğrulanmamış olduğu için eklenmeyen görseller")
+    return out
+
+
+def verified_image_urls_json(db, raw: str | None) -> str | None:
+    """Tek ürün için verified_image_map."""
+    return verified_image_map(db, {0: raw})[0]
@@ -1,10 +1,13 @@
-import json
-import pandas as pd
+from datetime import datetime
 from sqlalchemy import select
+from sqlalchemy.orm import undefer
 from .db import SessionLocal
 from .models import Product
+from .images import canonical_image_urls_json
 
 def ingest_csv(csv_path: str) -> int:
+    import pandas as pd  # ağır bağımlılık: sadece ingest çalışırken yüklensin
+
     df = pd.read_csv(csv_path)
     required = ["merchant_sku", "title"]
     for c in required:
@@ -23,23 +26,40 @@ def ingest_csv(csv_path: str) -> int:
             old = str(row["old_description"]) if "old_description" in df.columns and pd.notna(row.get("old_description")) else None
             src = str(row["source_url"]).strip() if "source_url" in df.columns and pd.notna(row.get("source_url")) else None
 
+            # Tek kanonik biçim: normalize edilmiş URL'lerin JSON listesi (app.images)
             image_urls = None
             if "image_urls" in df.columns and pd.notna(row.get("image_urls")):
-                raw = str(row["image_urls"]).strip()
-                if raw.startswith("["):
-                    image_urls = raw
-                else:
-                    image_urls = json.dumps([u.strip() for u in raw.split("|") if u.strip()], ensure_ascii=False)
+                image_urls = canonical_image_urls_json(str(row["image_urls"]))
 
-            existing = db.execute(select(Product).where(Product.merchant_sku == sku)).scalar_one_or_none()
+            existing = db.execute(
+                select(Product)
+                .options(undefer(Product.old_description), undefer(Product.image_urls_json))
+                .where(Product.merchant_sku == sku)
+            ).scalar_one_or_none()
             if existing:
-                existing.title = title
-                existing.barcode = barcode
-                existing.brand = brand
-                existing.category_path = cat
-                existing.old_description = old
-                existing.source_url = src
-                existing.image_urls_json = image_urls
+                new_values = {
+                    "title": title,
+                    "barcode": barcode,
+                    "brand": brand,
+                    "category_path": cat,
+                    "old_description": old,
+                    "source_url": src,
+                    "image_urls_json": image_urls,
+                }
+                changed = False
+                for k, v in new_values.items():
+                    if getattr(existing, k) != v:
+                        setattr(existing, k, v)
+                        changed = True
+                if changed:
+                    existing.updated_at = datetime.utcnow()
+                    # Kaynak değişti: önceki hatalar (dead-letter dahil) artık geçerli değil
+                    if existing.queue_state is not None:
+                        existing.queue_state = None
+                        existing.fail_attempts = 0
+                        existing.next_attempt_at = None
+                        existing.failure_class = None
+                        existing.dead_lettered_at = None
             else:
                 p = Product(
                     merchant_sku=sku,
@@ -49,7 +69,8 @@ def ingest_csv(csv_path: str) -> int:
                     category_path=cat,
                     old_description=old,
                     source_url=src,
-                    image_urls_json=image_urls
+                    image_urls_json=image_urls,
+                    updated_at=datetime.utcnow(),
                 )
                 db.add(p)
                 count += 1
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass, field
+
+from .config import settings
+
+
+@dataclass
+class LengthPlan:
+    """Bir üretim çağrısının uzunluk hedefi."""
+    chars_per_token: float
+    target_chars: int
+    target_tokens: int
+    max_output_tokens: int
+
+    def tokens_for(self, chars: int) -> int:
+        return int(math.ceil(chars / self.chars_per_token))
+
+
+@dataclass
+class _Ratio:
+    chars: int = 0
+    tokens: int = 0
+    n: int = 0
+
+    @property
+    def value(self) -> float:
+        return self.chars / self.tokens if self.tokens else 0.0
+
+
+@dataclass
+class LengthController:
+    """
+    Geçmiş üretimlerden (calib_chars / calib_tokens) model ve kategori başına
+    karakter/token oranını öğrenir; max_output_tokens ve prompt'taki uzunluk hedefi buradan.
+    Ölçüm sadece tamamlanmış üretim / uzatma çağrılarından gelir: max_output_tokens'a takılıp
+    kesilen yanıtlar ve onarım çağrıları sayılmaz (tavan kendi tahminini aşağı kilitlemesin).
+    Yeterli örnek yoksa model geneli, o da yoksa DEFAULT_CHARS_PER_TOKEN.
+    """
+
+    ratios: dict[tuple[str, str], _Ratio] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def refresh(self, db) -> None:
+        from sqlalchemy import func, select
+
+        from .models import Product, Generation
+        from .scheduler import category_key
+
+        recent = (
+            # tier: istenen model adı (model_name sürüm son eki taşıyabilir: gpt-4.1-mini-2025-04-14)
+            select(
+                func.coalesce(Generation.tier, Generation.model_name),
+                Generation.calib_chars,
+                Generation.calib_tokens,
+                Product.category_path,
+            )
+            .join(Product, Product.id == Generation.product_id)
+            .where(Generation.calib_tokens > 0)
+            .order_by(Generation.id.desc())
+            .limit(settings.length_stats_window)
+        )
+        ratios: dict[tuple[str, str], _Ratio] = {}
+        for model, chars, tokens, cat in db.execute(recent).all():
+            for key in ((model, category_key(cat)), (model, "*")):
+                r = ratios.setdefault(key, _Ratio())
+                r.chars += int(chars)
+                r.tokens += int(tokens)
+                r.n += 1
+        with self._lock:
+            self.ratios = ratios
+
+    def chars_per_token(self, model: str, category: str = "*") -> float:
+        with self._lock:
+            for key in ((model, category), (model, "*")):
+                r = self.ratios.get(key)
+                if r is not None and r.n >= settings.length_min_samples and r.value > 0:
+                    return r.value
+        return settings.default_chars_per_token
+
+    def plan(self, model: str, category_path: str | None = None) -> LengthPlan:
+        from .scheduler import category_key
+
+        cpt = self.chars_per_token(model, category_key(category_path))
+        target = (settings.min_chars + settings.max_chars) // 2
+        return LengthPlan(
+            chars_per_token=cpt,
+            target_chars=target,
+            target_tokens=int(math.ceil(target / cpt)),
+            # Üst sınır: max_chars + pay; fazlası zaten kırpılacağı için üretilmesine gerek yok
+            max_output_tokens=int(math.ceil(settings.max_chars / cpt * settings.length_token_headroom)),
+        )
+
+
+LENGTH = LengthController()
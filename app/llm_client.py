@@ -1,19 +1,26 @@
 from __future__ import annotations
 
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING
 
-load_dotenv(override=True)
+if TYPE_CHECKING:  # pragma: no cover
+    from openai import OpenAI
 
-_client: OpenAI | None = None
+_client: "OpenAI | None" = None
 
-def get_client() -> OpenAI:
+def get_client() -> "OpenAI":
+    # openai + dotenv ilk çağrıda yüklenir; import anında yan etki yok.
     global _client
     if _client is None:
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        from .config import settings
+
+        load_dotenv(override=True)
         _client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
-            timeout=30.0,
-            max_retries=1,
+            timeout=settings.llm_timeout,
+            max_retries=settings.llm_max_retries,
         )
     return _client
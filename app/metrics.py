@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# USD / 1M token: (input, cached input, output). Bilinmeyen model -> maliyet 0 sayılır.
+MODEL_PRICES: dict[str, tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+_SNAPSHOT_RE = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+def model_price(model: str | None) -> tuple[float, float, float] | None:
+    """API'nin döndüğü tarihli sürüm adı (gpt-4.1-mini-2025-04-14) da temel modele eşlenir."""
+    if not model:
+        return None
+    return MODEL_PRICES.get(model) or MODEL_PRICES.get(_SNAPSHOT_RE.sub("", model))
+
+
+def estimate_cost(model: str | None, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    p_in, p_cached, p_out = price
+    uncached = max(0, input_tokens - cached_tokens)
+    return (uncached * p_in + cached_tokens * p_cached + output_tokens * p_out) / 1_000_000
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        # Bucket üst sınırına göre kaba yüzdelik (özet raporu için yeterli).
+        if self.count == 0:
+            return None
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """
+    Süreç içi metrik kaydı (thread-safe):
+    - counter: toplam sayılar (token, çağrı, fallback)
+    - histogram: aşama / LLM çağrısı gecikmeleri
+    Prometheus text formatında dosyaya yazılabilir veya HTTP'den sunulabilir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._hists: dict[str, dict[tuple, _Histogram]] = {}
+        self._help: dict[str, str] = {}
+        # thread id -> o an içinde bulunulan aşama (örnekleyici profiler etiket için okur)
+        self._active: dict[int, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if help:
+                self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, help: str = "", buckets=DEFAULT_BUCKETS, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if help:
+                self._help.setdefault(name, help)
+            series = self._hists.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(buckets)
+            h.observe(value)
+
+    def active_stage(self, thread_id: int) -> str | None:
+        return self._active.get(thread_id)
+
+    @contextmanager
+    def stage(self, stage: str):
+        tid = threading.get_ident()
+        prev = self._active.get(tid)
+        self._active[tid] = stage
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if prev is None:
+                self._active.pop(tid, None)
+            else:
+                self._active[tid] = prev
+            self.observe(
+                "pipeline_stage_seconds",
+                time.perf_counter() - t0,
+                help="Pipeline aşama süreleri",
+                stage=stage,
+            )
+
+    def record_llm_call(self, model: str, latency_s: float, input_tokens: int, output_tokens: int, cached_tokens: int) -> None:
+        self.observe("llm_call_seconds", latency_s, help="LLM çağrı gecikmesi", model=model)
+        self.inc("llm_calls_total", help="LLM çağrı sayısı", model=model)
+        self.inc("llm_input_tokens_total", input_tokens, help="Girdi token", model=model)
+        self.inc("llm_output_tokens_total", output_tokens, help="Çıktı token", model=model)
+        self.inc("llm_cached_tokens_total", cached_tokens, help="Önbellekten gelen girdi token", model=model)
+        self.inc(
+            "llm_cost_usd_total",
+            estimate_cost(model, input_tokens, output_tokens, cached_tokens),
+            help="Tahmini maliyet (USD)",
+            model=model,
+        )
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(tuple(sorted(labels.items())), 0.0)
+            return sum(series.values())
+
+    def stage_summary(self) -> dict:
+        out = {}
+        with self._lock:
+            for key, h in self._hists.get("pipeline_stage_seconds", {}).items():
+                stage = dict(key).get("stage", "")
+                out[stage] = {
+                    "count": h.count,
+                    "total_s": round(h.sum, 3),
+                    "p50_s": h.quantile(0.5),
+                    "p95_s": h.quantile(0.95),
+                }
+        return out
+
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, v in series.items():
+                    lines.append(f"{name}{_label_str(key)} {v}")
+            for name, series in sorted(self._hists.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    acc = 0
+                    for i, b in enumerate(h.buckets):
+                        acc += h.counts[i]
+                        lines.append(f"{name}_bucket{_label_str(key + (('le', str(b)),))} {acc}")
+                    lines.append(f"{name}_bucket{_label_str(key + (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_label_str(key)} {h.sum}")
+                    lines.append(f"{name}_count{_label_str(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        # node_exporter textfile collector yarım dosya görmesin: önce tmp, sonra rename.
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Text, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import String, Text, Integer, Float, Boolean, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from .db import Base
@@ -15,13 +15,33 @@ class Product(Base):
     brand: Mapped[str | None] = mapped_column(String(256), nullable=True)
     category_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
 
-    old_description: Mapped[str | None] = mapped_column(Text, nullable=True)
-    image_urls_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Büyük metinler varsayılan olarak yüklenmez; ihtiyaç duyan sorgu kolonu açıkça seçer
+    # (ya da undefer eder). Kazara erişim sessiz bir ek sorgu yerine hata verir.
+    old_description: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True, deferred_raiseload=True)
+    image_urls_json: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True, deferred_raiseload=True)
     source_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Ingest'te içerik değiştiyse güncellenir (zamanlayıcının "yeni değişti" sinyali)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Zamanlayıcı skoru: claim sırası buna göre (yüksek önce)
+    priority: Mapped[float | None] = mapped_column(Float, nullable=True, index=True)
 
-    generations: Mapped[list["Generation"]] = relationship(back_populates="product")
+    # İş sahiplenme (lease): birden fazla worker/host aynı ürünü aynı anda üretmesin.
+    lease_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    last_run_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    # Yeniden deneme kuyruğu: FAIL sayısı, üstel geri çekilmeyle bir sonraki deneme zamanı,
+    # son hatanın sınıfı; kalıcı hatalar DEAD (dead-letter) olur ve claim edilmez.
+    queue_state: Mapped[str | None] = mapped_column(String(16), nullable=True, index=True)  # RETRY/DEAD
+    fail_attempts: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    failure_class: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    dead_lettered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # raiseload: toplu yollarda ilişki üzerinden N+1 yükleme olmasın
+    generations: Mapped[list["Generation"]] = relationship(back_populates="product", lazy="raise")
 
 class Generation(Base):
     __tablename__ = "generations"
@@ -33,11 +53,87 @@ class Generation(Base):
     prompt_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
     model_name: Mapped[str | None] = mapped_column(String(128), nullable=True)
 
-    generated_html: Mapped[str] = mapped_column(Text, nullable=False)
+    generated_html: Mapped[str] = mapped_column(Text, nullable=False, deferred=True, deferred_raiseload=True)
     char_count: Mapped[int] = mapped_column(Integer, nullable=False)
     status: Mapped[str] = mapped_column(String(16), nullable=False)  # PASS/FAIL
-    validation_report_json: Mapped[str] = mapped_column(Text, nullable=False)
+    validation_report_json: Mapped[str] = mapped_column(Text, nullable=False, deferred=True, deferred_raiseload=True)
+
+    # Ölçüm: hangi run, ne kadar sürdü, kaç token, stub'a neden düştü
+    run_id: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    latency_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    input_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    output_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    cached_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    retry_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    fallback_reason: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Yönlendirmenin istediği kademe (model); model_name gerçekte yanıt vereni tutar (stub olabilir)
+    tier: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Uzunluk denetimi: kaç uzatma çağrısı gerekti, kırpmada kaç karakter atıldı
+    expansion_calls: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    truncated_chars: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Karakter/token kalibrasyonu: sadece tamamlanmış (token sınırında kesilmemiş) üretim ve
+    # uzatma çağrılarının ham çıktı karakteri ve çıktı token'ı (onarım çağrıları hariç)
+    calib_chars: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    calib_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    product: Mapped["Product"] = relationship(back_populates="generations", lazy="raise")
+
+class WorkerRun(Base):
+    """Bir run içindeki tek worker'ın özeti; run özeti bu satırların toplamıdır."""
+    __tablename__ = "worker_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    run_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    worker_id: Mapped[str] = mapped_column(String(128), nullable=False)
+
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, default=0)
+    pass_count: Mapped[int] = mapped_column(Integer, default=0)
+    fail_count: Mapped[int] = mapped_column(Integer, default=0)
+    deferred: Mapped[int | None] = mapped_column(Integer, default=0)
+
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class Publication(Base):
+    """Bir PASS generation'ın Trendyol'a gönderim durumu (generation başına tek satır)."""
+    __tablename__ = "publications"
+    __table_args__ = (UniqueConstraint("generation_id", name="uq_publication_generation"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    generation_id: Mapped[int] = mapped_column(ForeignKey("generations.id"), nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False, index=True)
+    barcode: Mapped[str] = mapped_column(String(128), nullable=False)
+
+    batch_request_id: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False)  # SENT/PUBLISHED/FAILED
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class CircuitState(Base):
+    """Worker'lar (süreç/host) arası paylaşılan circuit breaker durumu."""
+    __tablename__ = "circuit_states"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    state: Mapped[str] = mapped_column(String(16), nullable=False)  # CLOSED/OPEN
+    opened_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class ImageCheck(Base):
+    """Görsel URL doğrulama önbelleği: her URL TTL süresince bir kez kontrol edilir (ürün / run'lar arası)."""
+    __tablename__ = "image_checks"
 
-    product: Mapped["Product"] = relationship(back_populates="generations")
+    url_hash: Mapped[str] = mapped_column(String(40), primary_key=True)  # sha1(url)
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    ok: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    content_type: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    content_length: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    checked_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
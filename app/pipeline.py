@@ -1,19 +1,316 @@
+"""
+Komut satırı:
+    python -m app.pipeline ingest   --csv data/input_products.csv
+    python -m app.pipeline generate --limit 100 --workers 4
+    python -m app.pipeline validate outputs/x.html
+    python -m app.pipeline verify-images                (görsel URL'lerini kontrol et, önbelleğe yaz)
+    python -m app.pipeline requeue  --failure-class ... (dead-letter'daki ürünleri kuyruğa geri al)
+    python -m app.pipeline publish  --limit 5000        (PASS açıklamaları Trendyol'a toplu gönder)
+    python -m app.pipeline export   --out outputs/generations.parquet --status PASS
+    python -m app.pipeline [run] --csv ... --limit ...   (ingest + verify-images + generate; eski kullanım)
+
+Ağır bağımlılıklar (pandas, openai, SQLAlchemy engine) sadece ilgili alt komut
+çalışırken yüklenir; --help veya validate gibi kısa işler bunları beklemez.
+"""
 import argparse
-from .ingest import ingest_csv
-from .run_batch import run_batch
+import json
+import os
+import sys
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--csv", default="data/input_products.csv")
-    ap.add_argument("--limit", type=int, default=None)
-    ap.add_argument("--force", action="store_true")
-    args = ap.parse_args()
+from .profiling import add_profile_args
+
+COMMANDS = ("run", "ingest", "verify-images", "generate", "requeue", "validate", "publish", "export")
+
+
+def _worker_main(limit, force, run_id, worker_id, metrics_file=None, profile_opts=None, deadline=None):
+    from .metrics import METRICS
+    from .profiling import Profiler
+    from .run_batch import run_batch
+
+    with Profiler(**(profile_opts or {"mode": None})) as prof:
+        with prof.stage("generate"):
+            r = run_batch(limit=limit, force=force, run_id=run_id, worker_id=worker_id, deadline=deadline)
+    if metrics_file:
+        METRICS.write_prometheus(metrics_file)
+    return r
+
+
+def _worker_path(path: str, i: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{i}{ext}"
 
-    n = ingest_csv(args.csv)
+
+def _ingest(args, prof) -> None:
+    from .ingest import ingest_csv
+    from .metrics import METRICS
+
+    with prof.stage("ingest"), METRICS.stage("ingest"):
+        n = ingest_csv(args.csv)
     print({"ingested": n})
 
-    r = run_batch(limit=args.limit, force=args.force)
+
+def _verify_images(args, prof) -> None:
+    from .images import verify_images
+    from .metrics import METRICS
+
+    with prof.stage("verify_images"), METRICS.stage("verify_images"):
+        r = verify_images(limit=getattr(args, "image_limit", None), force=getattr(args, "force_recheck", False))
+    print({"images": r})
+
+
+def _generate(args, prof) -> None:
+    import multiprocessing as mp
+    import time
+
+    from .claims import new_run_id, default_worker_id, run_summary
+    from .config import settings
+    from .db import SessionLocal
+    from .metrics import METRICS
+    from .run_batch import run_batch
+    from .scheduler import refresh_priorities
+
+    # Süre bütçesi duvar saatine çevrilir: tüm worker süreçleri aynı bitişi paylaşır.
+    budget = args.time_budget if args.time_budget is not None else settings.run_time_budget_s
+    deadline = time.time() + budget if budget and budget > 0 else None
+
+    run_id = args.run_id or new_run_id()
+    if not args.run_id:
+        # Ortak run'a sonradan katılan host'lar skoru yeniden hesaplamaz.
+        with SessionLocal() as db:
+            print({"prioritized": refresh_priorities(db)})
+    if args.workers <= 1:
+        with prof.stage("generate"):
+            run_batch(limit=args.limit, force=args.force, run_id=run_id, deadline=deadline)
+    else:
+        # spawn: engine/bağlantı havuzu fork ile kopyalanmasın
+        ctx = mp.get_context("spawn")
+        base = default_worker_id()
+        # Her süreç kendi metriklerini / profilini ayrı dosyaya yazar.
+        jobs = [
+            (
+                args.limit,
+                args.force,
+                run_id,
+                f"{base}/{i}",
+                _worker_path(args.metrics_file, i) if args.metrics_file else None,
+                {
+                    "mode": args.profile,
+                    "out_dir": os.path.join(args.profile_dir, f"worker-{i}"),
+                    "memory": args.profile_memory,
+                    "interval_ms": args.sample_interval_ms,
+                },
+                deadline,
+            )
+            for i in range(args.workers)
+        ]
+        with ctx.Pool(args.workers) as pool:
+            pool.starmap(_worker_main, jobs)
+
+    if args.metrics_file:
+        METRICS.write_prometheus(args.metrics_file)
+
+    with SessionLocal() as db:
+        summary = run_summary(db, run_id)
+    summary["stages"] = METRICS.stage_summary()
+    print(summary)
+    if args.summary_file:
+        with open(args.summary_file, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+def cmd_ingest(args) -> int:
+    from .db import init_db
+    from .profiling import profiler_from_args
+
+    init_db()
+    with profiler_from_args(args) as prof:
+        _ingest(args, prof)
+    return 0
+
+
+def cmd_generate(args) -> int:
+    from .db import init_db
+    from .metrics import METRICS
+    from .profiling import profiler_from_args
+
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    init_db()
+    with profiler_from_args(args) as prof:
+        _generate(args, prof)
+    return 0
+
+
+def cmd_run(args) -> int:
+    from .db import init_db
+    from .metrics import METRICS
+    from .profiling import profiler_from_args
+
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    init_db()
+    with profiler_from_args(args) as prof:
+        if not args.skip_ingest:
+            _ingest(args, prof)
+            _verify_images(args, prof)
+        _generate(args, prof)
+    return 0
+
+
+def cmd_verify_images(args) -> int:
+    from .db import init_db
+    from .profiling import profiler_from_args
+
+    init_db()
+    with profiler_from_args(args) as prof:
+        _verify_images(args, prof)
+    return 0
+
+
+def cmd_requeue(args) -> int:
+    from .db import SessionLocal, init_db
+    from .retry_queue import queue_summary, requeue
+
+    init_db()
+    with SessionLocal() as db:
+        if args.list:
+            print(json.dumps(queue_summary(db), ensure_ascii=False))
+            return 0
+        n = requeue(db, failure_class=args.failure_class, include_retry=args.include_retry)
+    print({"requeued": n})
+    return 0
+
+
+def cmd_validate(args) -> int:
+    # Sadece validator + config: DB / LLM / pandas yüklenmez.
+    from .config import settings
+    from .validator import Validator
+
+    validator = Validator(settings.banned_words_path)
+    failed = 0
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            vr = validator.validate(f.read())
+        print(json.dumps({"file": path, **vr.report}, ensure_ascii=False))
+        if not vr.ok:
+            failed += 1
+    return 1 if failed else 0
+
+
+def cmd_publish(args) -> int:
+    from .db import init_db
+    from .publish import publish
+
+    init_db()
+    r = publish(
+        limit=args.limit,
+        max_attempts=args.max_attempts,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        poll_timeout=args.poll_timeout,
+    )
     print(r)
+    return 1 if r["failed"] else 0
+
+
+def cmd_export(args) -> int:
+    from datetime import datetime
+
+    from .export import export_generations
+
+    r = export_generations(
+        out_path=args.out,
+        fmt=args.format,
+        status=None if args.status == "ALL" else args.status,
+        version=args.version,
+        since=datetime.fromisoformat(args.since) if args.since else None,
+        until=datetime.fromisoformat(args.until) if args.until else None,
+        latest_only=not args.all_versions,
+        row_group_size=args.row_group_size,
+    )
+    print(r)
+    return 0
+
+
+def _add_generate_args(ap) -> None:
+    ap.add_argument("--limit", type=int, default=None, help="worker başına işlenecek ürün sayısı")
+    ap.add_argument("--force", action="store_true")
+    ap.add_argument("--workers", type=int, default=1, help="bu makinede başlatılacak worker süreci sayısı")
+    ap.add_argument("--run-id", default=None, help="diğer host'larla ortak run id (özet bunun üzerinden toplanır)")
+    ap.add_argument("--metrics-file", default=None, help="Prometheus text formatında metrik dosyası (ör. outputs/metrics.prom)")
+    ap.add_argument("--metrics-port", type=int, default=None, help="çalışırken /metrics HTTP endpoint'i")
+    ap.add_argument("--summary-file", default=None, help="run özetini JSON olarak yaz")
+    ap.add_argument("--time-budget", type=float, default=None, help="run süre bütçesi, saniye (varsayılan: RUN_TIME_BUDGET_S)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m app.pipeline")
+    sub = ap.add_subparsers(dest="command")
+
+    p = sub.add_parser("run", help="ingest + generate")
+    p.add_argument("--csv", default="data/input_products.csv")
+    p.add_argument("--skip-ingest", action="store_true", help="sadece üretim (ek worker host'ları için)")
+    _add_generate_args(p)
+    add_profile_args(p)
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("ingest", help="CSV'den ürünleri yükle")
+    p.add_argument("--csv", default="data/input_products.csv")
+    add_profile_args(p)
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("verify-images", help="görsel URL'lerini eşzamanlı kontrol et (TTL önbellekli)")
+    p.add_argument("--image-limit", type=int, default=None, help="bu çağrıda kontrol edilecek azami URL")
+    p.add_argument("--force-recheck", action="store_true", help="önbellek süresi dolmamış olanları da kontrol et")
+    add_profile_args(p)
+    p.set_defaults(func=cmd_verify_images)
+
+    p = sub.add_parser("generate", help="bekleyen ürünler için açıklama üret")
+    _add_generate_args(p)
+    add_profile_args(p)
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("requeue", help="dead-letter'daki ürünleri kuyruğa geri al (deneme sayısı sıfırlanır)")
+    p.add_argument("--failure-class", default=None, help="sadece bu hata sınıfı (ör. protected_banned)")
+    p.add_argument("--include-retry", action="store_true", help="geri çekilmede bekleyenleri de hemen aç")
+    p.add_argument("--list", action="store_true", help="kuyruk durumunu göster, değişiklik yapma")
+    p.set_defaults(func=cmd_requeue)
+
+    p = sub.add_parser("validate", help="HTML dosyalarını kurallara göre doğrula")
+    p.add_argument("files", nargs="+")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("publish", help="onaylı (PASS) açıklamaları Trendyol'a toplu gönder")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--max-attempts", type=int, default=3, help="FAILED item'lar için toplam deneme")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--batch-size", type=int, default=None, help="varsayılan: API üst sınırı (1000)")
+    p.add_argument("--poll-interval", type=float, default=2.0)
+    p.add_argument("--poll-timeout", type=float, default=600.0)
+    p.set_defaults(func=cmd_publish)
+
+    p = sub.add_parser("export", help="generation'ları JSONL / Parquet / XLSX olarak akışla dışa aktar")
+    p.add_argument("--out", required=True, help="çıktı dosyası (format uzantıdan anlaşılır)")
+    p.add_argument("--format", choices=["jsonl", "parquet", "xlsx"], default=None)
+    p.add_argument("--status", default="PASS", help="PASS / FAIL / ALL")
+    p.add_argument("--version", type=int, default=None)
+    p.add_argument("--since", default=None, help="created_at >= (ISO tarih)")
+    p.add_argument("--until", default=None, help="created_at < (ISO tarih)")
+    p.add_argument("--all-versions", action="store_true", help="ürün başına sadece en son versiyon yerine hepsi")
+    p.add_argument("--row-group-size", type=int, default=1000, help="Parquet row group boyutu")
+    p.set_defaults(func=cmd_export)
+
+    return ap
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Geriye uyumluluk: alt komut verilmezse eski davranış (ingest + generate)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
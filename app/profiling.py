@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from .metrics import METRICS
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _Sampler(threading.Thread):
+    """
+    Düşük maliyetli örnekleyici profiler: interval'de bir tüm thread'lerin yığınını okur.
+    Hedef kodu enstrümante etmez; maliyet örnek sıklığıyla orantılı (10ms'de ~%1-2),
+    bu yüzden production batch'inde açık bırakılabilir.
+    """
+
+    def __init__(self, profiler: "Profiler", interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop_evt.wait(self.interval):
+            if not names or len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                stage = self.profiler.stage_for(tid)
+                root = [stage, names.get(tid, str(tid))]
+                self.samples[";".join(root + stack)] += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Aşama bazlı profil:
+    - mode="cprofile": her aşama için <dir>/<stage>.prof (+ okunabilir <stage>.txt)
+    - mode="sample":  örnekleyici; <dir>/<stage>.collapsed ve hepsi için profile.collapsed
+      (flamegraph.pl / speedscope / inferno'nun beklediği "a;b;c count" formatı)
+    - memory=True:    tracemalloc; her aşama için tepe bellek ve en çok ayıran satırlar
+    Aşamalar: Profiler.stage(...) ile açılanlar + METRICS.stage(...) ile işaretlenen iç aşamalar
+    (örnekleyici thread'in o anki metrik aşamasını etikete yazar).
+    """
+
+    def __init__(self, mode: str | None, out_dir: str = "outputs/profiles", memory: bool = False, interval_ms: float = 10.0):
+        if mode not in (None, "cprofile", "sample"):
+            raise ValueError(f"Bilinmeyen profil modu: {mode}")
+        self.mode = mode
+        self.out_dir = out_dir
+        self.memory = memory
+        self.interval = interval_ms / 1000.0
+        self._stages: dict[int, list[str]] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._mem: dict[str, dict] = {}
+        self._sampler: _Sampler | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None or self.memory
+
+    def stage_for(self, tid: int) -> str:
+        metric_stage = METRICS.active_stage(tid)
+        stack = self._stages.get(tid)
+        outer = stack[-1] if stack else None
+        if outer and metric_stage:
+            return f"{outer}/{metric_stage}"
+        return outer or metric_stage or "other"
+
+    def start(self) -> "Profiler":
+        if not self.enabled:
+            return self
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.mode == "sample":
+            self._sampler = _Sampler(self, self.interval)
+            self._sampler.start()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        return self
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        tid = threading.get_ident()
+        self._stages.setdefault(tid, []).append(name)
+
+        prof = None
+        if self.mode == "cprofile":
+            prof = self._profiles.setdefault(name, cProfile.Profile())
+            prof.enable()
+        if self.memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            if prof is not None:
+                prof.disable()
+            if self.memory:
+                self._snapshot_memory(name, elapsed)
+            self._stages[tid].pop()
+
+    def _snapshot_memory(self, name: str, elapsed: float) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        snap = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        top = snap.statistics("lineno")[:25]
+        prev = self._mem.get(name)
+        self._mem[name] = {
+            "peak_bytes": max(peak, prev["peak_bytes"]) if prev else peak,
+            "current_bytes": current,
+            "elapsed_s": elapsed + (prev["elapsed_s"] if prev else 0.0),
+            "top": [str(s) for s in top],
+        }
+
+    def stop(self) -> list[str]:
+        """Profili bitirir, yazılan dosyaların listesini döner."""
+        written: list[str] = []
+        if not self.enabled:
+            return written
+
+        for name, prof in self._profiles.items():
+            path = os.path.join(self.out_dir, f"{name}.prof")
+            prof.dump_stats(path)
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+            with open(os.path.join(self.out_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(buf.getvalue())
+            written.append(path)
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            per_stage: dict[str, list[str]] = {}
+            for stack, n in self._sampler.samples.items():
+                stage = stack.split(";", 1)[0].split("/", 1)[0]
+                per_stage.setdefault(stage, []).append(f"{stack} {n}")
+            for stage, lines in per_stage.items():
+                path = os.path.join(self.out_dir, f"{stage}.collapsed")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                written.append(path)
+            path = os.path.join(self.out_dir, "profile.collapsed")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{s} {n}\n" for s, n in self._sampler.samples.items()))
+            written.append(path)
+            self._sampler = None
+
+        if self._mem:
+            path = os.path.join(self.out_dir, "tracemalloc.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                for name, m in self._mem.items():
+                    f.write(
+                        f"== {name}: peak={m['peak_bytes'] / 1024 / 1024:.1f} MiB "
+                        f"current={m['current_bytes'] / 1024 / 1024:.1f} MiB elapsed={m['elapsed_s']:.2f}s\n"
+                    )
+                    f.write("\n".join(m["top"]) + "\n\n")
+            written.append(path)
+            tracemalloc.stop()
+
+        return written
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        files = self.stop()
+        if files:
+            print({"profile_files": files})
+
+
+def add_profile_args(ap) -> None:
+    ap.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=["cprofile", "sample"],
+        default=None,
+        help="aşama bazlı profil: cprofile (detaylı) veya sample (düşük maliyetli, collapsed stack)",
+    )
+    ap.add_argument("--profile-dir", default="outputs/profiles")
+    ap.add_argument("--profile-memory", action="store_true", help="tracemalloc ile aşama bazlı tepe bellek")
+    ap.add_argument("--sample-interval-ms", type=float, default=10.0)
+
+
+def profiler_from_args(args, out_dir: str | None = None) -> Profiler:
+    return Profiler(
+        mode=args.profile,
+        out_dir=out_dir or args.profile_dir,
+        memory=args.profile_memory,
+        interval_ms=args.sample_interval_ms,
+    )
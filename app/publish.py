@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime
+
+from sqlalchemy import select, func, and_, or_, update
+
+from .db import SessionLocal
+from .metrics import METRICS
+from .models import Product, Generation, Publication
+
+
+def _publishable(db, max_attempts: int, limit: int | None):
+    """
+    Her ürünün en son PASS generation'ı; barkodu olan, henüz yayınlanmamış / yolda olmayan
+    ya da FAILED olup deneme hakkı kalmış olanlar. Stub'a düşülmüş (fallback) çıktı yayınlanmaz.
+    Sadece küçük kolonlar okunur.
+    """
+    latest = (
+        select(Generation.product_id, func.max(Generation.version).label("v"))
+        .where(Generation.status == "PASS", Generation.fallback_reason.is_(None))
+        .group_by(Generation.product_id)
+        .subquery()
+    )
+    q = (
+        select(Generation.id, Generation.product_id, Product.barcode, Publication.attempts)
+        .join(latest, and_(latest.c.product_id == Generation.product_id, latest.c.v == Generation.version))
+        .join(Product, Product.id == Generation.product_id)
+        .outerjoin(Publication, Publication.generation_id == Generation.id)
+        .where(
+            Generation.status == "PASS",
+            Generation.fallback_reason.is_(None),
+            Product.barcode.is_not(None),
+            or_(
+                Publication.id.is_(None),
+                and_(Publication.status == "FAILED", Publication.attempts < max_attempts),
+            ),
+        )
+        .order_by(Generation.product_id)
+    )
+    if limit:
+        q = q.limit(limit)
+    return db.execute(q).all()
+
+
+def _poll_until_done(batch_request_id: str, poll_interval: float, poll_timeout: float) -> dict:
+    from services.trendyol_api import get_batch_request
+
+    deadline = time.monotonic() + poll_timeout
+    while True:
+        data = get_batch_request(batch_request_id)
+        if data.get("status") == "COMPLETED" or time.monotonic() >= deadline:
+            return data
+        time.sleep(poll_interval)
+
+
+def _send_chunk(items: list[dict]) -> str:
+    from services.trendyol_api import update_products_batch
+
+    t0 = time.perf_counter()
+    bid = update_products_batch(items)
+    METRICS.observe("publish_batch_send_seconds", time.perf_counter() - t0, help="Toplu güncelleme isteği süresi")
+    return bid
+
+
+def _apply_batch_result(db, batch_request_id: str, data: dict, stats: dict) -> None:
+    now = datetime.utcnow()
+    if data.get("status") != "COMPLETED":
+        # Süre doldu: SENT olarak kalır, sonraki publish çağrısı izlemeye devam eder.
+        stats["in_progress"] += 1
+        return
+    for it in data.get("items", []):
+        barcode = (it.get("requestItem") or {}).get("barcode")
+        ok = it.get("status") == "SUCCESS"
+        db.execute(
+            update(Publication)
+            .where(Publication.batch_request_id == batch_request_id, Publication.barcode == barcode)
+            .values(
+                status="PUBLISHED" if ok else "FAILED",
+                error=None if ok else json.dumps(it.get("failureReasons") or [], ensure_ascii=False),
+                updated_at=now,
+            )
+        )
+        stats["published" if ok else "item_failures"] += 1
+        METRICS.inc("publish_items_total", help="Yayın sonuçları", status="PUBLISHED" if ok else "FAILED")
+    # Sonuçta yer almayan item'lar SENT kalırsa ne yeniden denenir ne de izlemeden çıkar
+    missing = db.execute(
+        update(Publication)
+        .where(Publication.batch_request_id == batch_request_id, Publication.status == "SENT")
+        .values(status="FAILED", error="batch sonucunda item yok", updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+    if missing:
+        stats["item_failures"] += missing
+        METRICS.inc("publish_items_total", missing, help="Yayın sonuçları", status="FAILED")
+    db.commit()
+
+
+def _poll_batches(db, batch_ids: list[str], concurrency: int, poll_interval: float, poll_timeout: float, stats: dict) -> None:
+    if not batch_ids:
+        return
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        futures = {ex.submit(_poll_until_done, bid, poll_interval, poll_timeout): bid for bid in batch_ids}
+        for fut in as_completed(futures):
+            bid = futures[fut]
+            try:
+                data = fut.result()
+            except Exception as e:
+                # Durum okunamadı: SENT kalır, sonraki çağrıda tekrar izlenir
+                stats["poll_errors"] += 1
+                stats.setdefault("errors", []).append(f"{bid}: {e}")
+                continue
+            _apply_batch_result(db, bid, data, stats)
+
+
+def publish(
+    limit: int | None = None,
+    max_attempts: int = 3,
+    concurrency: int = 8,
+    batch_size: int | None = None,
+    poll_interval: float = 2.0,
+    poll_timeout: float = 600.0,
+) -> dict:
+    """
+    Onaylı (PASS) açıklamaları Trendyol'a toplu gönderir:
+    1) önceki çağrıdan yolda kalan (SENT) batch'leri izler
+    2) yayınlanacakları izin verilen en büyük batch'lere böler, havuzlu session ile paralel gönderir
+    3) batchRequestId'leri kaydeder, durumları paralel poll eder; ürün bazında PUBLISHED/FAILED
+    4) sadece FAILED item'ları max_attempts'e kadar yeniden gönderir
+    """
+    from services.trendyol_api import BATCH_MAX_ITEMS
+
+    batch_size = min(batch_size or BATCH_MAX_ITEMS, BATCH_MAX_ITEMS)
+    stats = {"sent": 0, "published": 0, "item_failures": 0, "batches": 0, "rounds": 0, "in_progress": 0, "poll_errors": 0}
+    t0 = time.perf_counter()
+
+    with SessionLocal() as db:
+        pending = [
+            r[0]
+            for r in db.execute(
+                select(Publication.batch_request_id)
+                .where(Publication.status == "SENT", Publication.batch_request_id.is_not(None))
+                .distinct()
+            ).all()
+        ]
+        _poll_batches(db, pending, concurrency, poll_interval, poll_timeout, stats)
+
+        for _ in range(max_attempts):
+            rows = _publishable(db, max_attempts, limit)
+            if not rows:
+                break
+            stats["rounds"] += 1
+
+            sent_batches: list[str] = []
+            chunks = iter([rows[i:i + batch_size] for i in range(0, len(rows), batch_size)])
+            # En fazla `concurrency` chunk yolda: HTML'ler gönderimden hemen önce okunur ve
+            # future bitince bırakılır (round'un tüm HTML'i aynı anda bellekte tutulmaz).
+            with ThreadPoolExecutor(max_workers=concurrency) as ex:
+                in_flight: dict = {}
+
+                def fill() -> None:
+                    while len(in_flight) < concurrency:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            return
+                        html_by_id = dict(
+                            db.execute(
+                                select(Generation.id, Generation.generated_html)
+                                .where(Generation.id.in_([r[0] for r in chunk]))
+                            ).all()
+                        )
+                        items = [{"barcode": r[2], "description": html_by_id[r[0]]} for r in chunk]
+                        in_flight[ex.submit(_send_chunk, items)] = chunk
+
+                fill()
+                while in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        chunk = in_flight.pop(fut)
+                        try:
+                            bid, err, status = fut.result(), None, "SENT"
+                            sent_batches.append(bid)
+                            stats["batches"] += 1
+                            stats["sent"] += len(chunk)
+                        except Exception as e:
+                            bid, err, status = None, str(e)[:2000], "FAILED"
+                            stats["item_failures"] += len(chunk)
+                        _record_sent(db, chunk, bid, status, err)
+                    fill()
+
+            _poll_batches(db, sent_batches, concurrency, poll_interval, poll_timeout, stats)
+
+        # Deneme hakkı bitmiş, hâlâ başarısız olanlar
+        stats["failed"] = db.execute(
+            select(func.count(Publication.id)).where(
+                Publication.status == "FAILED", Publication.attempts >= max_attempts
+            )
+        ).scalar_one()
+
+    elapsed = time.perf_counter() - t0
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["items_per_s"] = round(stats["published"] / elapsed, 2) if elapsed > 0 else None
+    return stats
+
+
+def _record_sent(db, chunk, batch_request_id: str | None, status: str, error: str | None) -> None:
+    now = datetime.utcnow()
+    for gen_id, product_id, barcode, attempts in chunk:
+        if attempts is None:
+            db.add(Publication(
+                generation_id=gen_id,
+                product_id=product_id,
+                barcode=barcode,
+                batch_request_id=batch_request_id,
+                status=status,
+                attempts=1,
+                error=error,
+                updated_at=now,
+            ))
+        else:
+            db.execute(
+                update(Publication)
+                .where(Publication.generation_id == gen_id)
+                .values(
+                    batch_request_id=batch_request_id,
+                    status=status,
+                    attempts=Publication.attempts + 1,
+                    error=error,
+                    updated_at=now,
+                )
+            )
+    db.commit()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+from .config import settings
+from .validator import Validator, ValidationResult, split_blocks
+
+# İzinsiz etiketlerin deterministik karşılıkları (model çağrısı gerektirmez); listede olmayan silinir.
+_TAG_MAP = {
+    "b": ("<strong>", "</strong>"),
+    "h1": ("<strong>", "</strong><br/>"),
+    "h2": ("<strong>", "</strong><br/>"),
+    "h3": ("<strong>", "</strong><br/>"),
+    "h4": ("<strong>", "</strong><br/>"),
+    "p": ("", "<br/>"),
+    "div": ("", "<br/>"),
+    "ol": ("<ul>", "</ul>"),
+}
+_LEAD_TAGS_RE = re.compile(r"^(?:\s*<[^>]+>)+")
+_TRAIL_TAGS_RE = re.compile(r"(?:<[^>]+>\s*)+$")
+_MARK_RE = re.compile(r"<<<(\d+)>>>\s*(.*?)(?=<<<\d+>>>|\Z)", re.DOTALL)
+
+
+@dataclass
+class RepairStats:
+    rounds: int = 0
+    blocks_sent: int = 0
+    blocks_fixed: int = 0
+    tag_fixes: int = 0
+
+
+def _errors_by_type(report: dict) -> dict[str, dict]:
+    return {e["type"]: e for e in report.get("errors", [])}
+
+
+def fix_disallowed_tags(html: str, report: dict) -> tuple[str, int]:
+    """İzinsiz etiketleri izinli karşılıklarıyla değiştirir (sondan başa, offset'ler bozulmasın)."""
+    err = _errors_by_type(report).get("DISALLOWED_TAGS")
+    if not err:
+        return html, 0
+    spans = sorted(err["spans"], key=lambda s: s["start"], reverse=True)
+    for sp in spans:
+        raw = html[sp["start"]:sp["end"]]
+        opening, closing = _TAG_MAP.get(sp["tag"], ("", ""))
+        html = html[:sp["start"]] + (closing if raw.startswith("</") else opening) + html[sp["end"]:]
+    return html, len(spans)
+
+
+def repair_targets(html: str, report: dict) -> dict[tuple[int, int], list[str]]:
+    """
+    Onarılacak bloklar ve her birinin sorunları. Korunan eski açıklama bölümüne dokunulmaz;
+    tekrar kümelerinde cümlenin ilk geçtiği blok kalır, diğerleri yeniden yazılır.
+    """
+    blocks = split_blocks(html)
+    protected = report.get("protected")
+
+    def block_of(pos: int) -> tuple[int, int] | None:
+        for a, b in blocks:
+            if a <= pos < b:
+                return a, b
+        return None
+
+    targets: dict[tuple[int, int], list[str]] = {}
+    errs = _errors_by_type(report)
+    for sp in errs.get("BANNED_WORDS", {}).get("spans", []):
+        if sp.get("protected"):
+            continue
+        blk = block_of(sp["start"])
+        if blk:
+            targets.setdefault(blk, []).append(f'yasaklı ifade: "{sp["word"]}"')
+    for cl in report.get("dup_clusters", []):
+        for a, b in cl["spans"][1:]:
+            if protected and protected[0] <= a < protected[1]:
+                continue
+            targets.setdefault((a, b), []).append(f'başka bir yerde aynen geçen cümle: "{cl["sentence"][:80]}"')
+    return dict(sorted(targets.items())[: settings.repair_max_blocks])
+
+
+def _split_inner(fragment: str) -> tuple[str, str, str]:
+    """Bloğun baş/son etiketleri sabit kalır, sadece iç metin modele gider."""
+    lead = _LEAD_TAGS_RE.match(fragment)
+    head = lead.group(0) if lead else ""
+    rest = fragment[len(head):]
+    trail = _TRAIL_TAGS_RE.search(rest)
+    tail = trail.group(0) if trail else ""
+    return head, rest[: len(rest) - len(tail)], tail
+
+
+def build_repair_prompt(items: list[tuple[str, list[str]]]) -> str:
+    parts = []
+    for i, (text, problems) in enumerate(items, 1):
+        parts.append(f"<<<{i}>>>\nSORUNLAR: {'; '.join(sorted(set(problems)))}\nMETİN: {text}")
+    blocks = "\n\n".join(parts)
+    return f"""
+Below are numbered fragments of a Turkish product description, each with its problems.
+Rewrite ONLY these fragments so the problems disappear.
+
+RULES:
+- Keep the meaning, language (Turkish) and roughly the same length of each fragment.
+- Do NOT use the listed banned expressions or any exaggerated marketing claims.
+- Do NOT reuse the repeated sentence; give new, specific information instead.
+- Use ONLY <strong> inline if needed; no other tags.
+- Output format: for each fragment, the marker line <<<N>>> followed by the rewritten text. Nothing else.
+
+{blocks}
+""".strip()
+
+
+def parse_repair_output(text: str) -> dict[int, str]:
+    return {int(m.group(1)): m.group(2).strip() for m in _MARK_RE.finditer(text or "") if m.group(2).strip()}
+
+
+def repair_html(
+    html: str,
+    vr: ValidationResult,
+    validator: Validator,
+    fix_fn: Callable[[str], str],
+    max_rounds: int | None = None,
+) -> tuple[str, ValidationResult, RepairStats]:
+    """
+    Hedefli onarım: belgenin tamamı yerine sadece sorunlu bloklar modele gönderilir,
+    düzeltilen parçalar yerine eklenir ve yeniden doğrulanır.
+    - izinsiz etiketler model çağrılmadan eşlenir
+    - her parça önce tek başına kontrol edilir (yasaklı kelime / etiket); geçemeyen eklenmez,
+      sonraki turda yeniden denenir
+    - uzunluk hatası burada ele alınmaz (üretimdeki uzatma / kırpma adımları)
+    """
+    stats = RepairStats()
+    max_rounds = settings.repair_max_rounds if max_rounds is None else max_rounds
+
+    html, stats.tag_fixes = fix_disallowed_tags(html, vr.report)
+    if stats.tag_fixes:
+        vr = validator.validate(html)
+
+    for _ in range(max_rounds):
+        if vr.ok:
+            break
+        targets = repair_targets(html, vr.report)
+        if not targets:
+            break
+        stats.rounds += 1
+
+        spans = list(targets)
+        pieces = [_split_inner(html[a:b]) for a, b in spans]
+        prompt = build_repair_prompt([(inner, targets[sp]) for sp, (_, inner, _) in zip(spans, pieces)])
+        stats.blocks_sent += len(spans)
+        fixed = parse_repair_output(fix_fn(prompt))
+
+        replacements = []
+        for i, ((a, b), (head, _, tail)) in enumerate(zip(spans, pieces), 1):
+            new_inner = fixed.get(i)
+            if not new_inner:
+                continue
+            fragment = head + new_inner + tail
+            if validator.check_fragment(fragment):
+                continue
+            replacements.append((a, b, fragment))
+
+        if not replacements:
+            break
+        for a, b, fragment in sorted(replacements, reverse=True):
+            html = html[:a] + fragment + html[b:]
+        stats.blocks_fixed += len(replacements)
+        vr = validator.validate(html)
+
+    return html, vr, stats
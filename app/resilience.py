@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from .config import settings
+from .metrics import METRICS
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+
+class CircuitOpenError(Exception):
+    """Devre açık: çağrı yapılmadan hemen fallback'e düşülmeli."""
+
+
+class DeadlineExceeded(Exception):
+    """Run süre bütçesi bitti."""
+
+
+class HedgeTimeout(TimeoutError):
+    """Hedge'li çağrının ne asıl ne kopya isteği zaman aşımı içinde dönmedi."""
+
+
+class CircuitBreaker:
+    """
+    Kayan pencerede hata oranı eşiği aşılınca açılır (OPEN): open_seconds boyunca çağrılar
+    hiç yapılmadan CircuitOpenError ile reddedilir. Süre dolunca HALF_OPEN: tek bir deneme
+    çağrısına izin verilir; başarılıysa kapanır, başarısızsa yeniden açılır.
+
+    Paylaşım: süreç içinde thread-safe; süreçler/host'lar arası OPEN durumu DB'deki
+    circuit_states satırıyla yayılır (sync_seconds'ta bir okunur, geçişlerde yazılır).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int | None = None,
+        min_calls: int | None = None,
+        error_rate: float | None = None,
+        open_seconds: float | None = None,
+        sync_seconds: float | None = None,
+        shared: bool = True,
+    ):
+        self.name = name
+        self.window = window or settings.breaker_window
+        self.min_calls = min_calls or settings.breaker_min_calls
+        self.error_rate = error_rate if error_rate is not None else settings.breaker_error_rate
+        self.open_seconds = open_seconds if open_seconds is not None else settings.breaker_open_seconds
+        self.sync_seconds = sync_seconds if sync_seconds is not None else settings.breaker_sync_seconds
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self._outcomes: deque[bool] = deque(maxlen=self.window)
+        self._state = CLOSED
+        self._opened_until = 0.0  # time.time()
+        self._probe_in_flight = False
+        self._last_sync = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.time())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now >= self._opened_until:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def is_open(self) -> bool:
+        """Deneme hakkı tüketmeden: devre şu an kesin açık mı (HALF_OPEN değil)."""
+        now = time.time()
+        self._sync_from_db(now)
+        with self._lock:
+            return self._current_state(now) == OPEN
+
+    def allow(self) -> bool:
+        now = time.time()
+        self._sync_from_db(now)
+        with self._lock:
+            state = self._current_state(now)
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """HALF_OPEN deneme hakkını sonuç yazmadan geri verir (istek hatası, süre bitimi vb.)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._outcomes.append(True)
+            closed_now = self._state == HALF_OPEN
+            if closed_now:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probe_in_flight = False
+        if closed_now:
+            METRICS.inc("circuit_transitions_total", help="Circuit breaker durum geçişleri", breaker=self.name, to=CLOSED)
+            self._write_db(CLOSED, None)
+
+    def record_failure(self) -> None:
+        now = time.time()
+        with self._lock:
+            self._outcomes.append(False)
+            trip = False
+            if self._state == HALF_OPEN:
+                trip = True
+            elif self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                trip = failures / len(self._outcomes) >= self.error_rate
+            if trip:
+                self._state = OPEN
+                self._opened_until = now + self.open_seconds
+                self._probe_in_flight = False
+        if trip:
+            METRICS.inc("circuit_transitions_total", help="Circuit breaker durum geçişleri", breaker=self.name, to=OPEN)
+            self._write_db(OPEN, datetime.utcnow() + timedelta(seconds=self.open_seconds))
+
+    # --- süreçler arası paylaşım ---
+
+    def _sync_from_db(self, now: float) -> None:
+        if not self.shared or now - self._last_sync < self.sync_seconds:
+            return
+        self._last_sync = now
+        try:
+            from .db import SessionLocal
+            from .models import CircuitState
+
+            with SessionLocal() as db:
+                row = db.get(CircuitState, self.name)
+                if row is None or row.state != OPEN or row.opened_until is None:
+                    return
+                remaining = (row.opened_until - datetime.utcnow()).total_seconds()
+        except Exception:
+            return  # DB erişilemiyorsa yerel durumla devam
+        if remaining > 0:
+            with self._lock:
+                if self._state == CLOSED:
+                    self._state = OPEN
+                    self._opened_until = now + remaining
+
+    def _write_db(self, state: str, opened_until: datetime | None) -> None:
+        if not self.shared:
+            return
+        try:
+            from .db import SessionLocal
+            from .models import CircuitState
+
+            with SessionLocal() as db:
+                row = db.get(CircuitState, self.name)
+                if row is None:
+                    row = CircuitState(name=self.name, state=state)
+                    db.add(row)
+                row.state = state
+                row.opened_until = opened_until
+                row.updated_at = datetime.utcnow()
+                db.commit()
+        except Exception:
+            pass  # paylaşım en iyi çaba; yerel breaker yine çalışır
+
+
+class LatencyTracker:
+    """Son başarılı çağrı sürelerinden p95 (hedge gecikmesi için)."""
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < 10:
+                return None
+            data = sorted(self._samples)
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.quantile(0.95)
+        if p95 is None:
+            return max(settings.llm_hedge_min_delay, settings.llm_timeout / 2)
+        return max(settings.llm_hedge_min_delay, p95)
+
+
+_hedge_pool: ThreadPoolExecutor | None = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+    return _hedge_pool
+
+
+def hedged_call(fn, delay: float, timeout: float | None = None, on_discard=None):
+    """
+    fn'i çalıştırır; delay içinde bitmezse aynı çağrının bir kopyasını daha başlatır,
+    hangisi önce başarılı dönerse onu kullanır (kuyruk gecikmesini kırpar).
+    İkisi de hata verirse son hatayı yükseltir, timeout (asıl isteğin gönderildiği andan
+    itibaren) dolarsa HedgeTimeout. Sonucu kullanılmayan çağrılar (kaybeden, ilk hata veren,
+    zaman aşımında bekleyenler) bitince on_discard(future) çağrılır: harcanan token'lar ve
+    servis sağlığı kaybolmasın.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    primary = _pool().submit(fn)
+    done, _ = wait([primary], timeout=delay)
+    if done and primary.exception() is None:
+        return primary.result()
+    if done:
+        raise primary.exception()
+
+    METRICS.inc("llm_hedges_total", help="Başlatılan hedge çağrıları")
+    hedge = _pool().submit(fn)
+    futures = [primary, hedge]
+    winner = None
+    try:
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    if f is hedge:
+                        METRICS.inc("llm_hedge_wins_total", help="Hedge çağrısının önce döndüğü durumlar")
+                    winner = f
+                    return f.result()
+                winner = f  # son hata yükseltilir; çağıran raporlar
+        if winner is not None:
+            raise winner.exception()
+        raise HedgeTimeout("hedged_call zaman aşımı")
+    finally:
+        if on_discard is not None:
+            for f in futures:
+                if f is not winner:
+                    f.add_done_callback(on_discard)
+
+
+class RunDeadline:
+    """
+    Run'ın toplam süre bütçesi (duvar saati; aynı run'ın worker süreçleri aynı bitişi paylaşır).
+    Çağrı başına zaman aşımı buradan türetilir: kalan süre LLM zaman aşımından kısaysa o kadar beklenir.
+    """
+
+    def __init__(self, until: float | None = None):
+        self.until = until
+
+    @classmethod
+    def from_budget(cls, budget_s: float | None) -> "RunDeadline":
+        budget_s = settings.run_time_budget_s if budget_s is None else budget_s
+        return cls(time.time() + budget_s if budget_s and budget_s > 0 else None)
+
+    def remaining(self) -> float | None:
+        if self.until is None:
+            return None
+        return self.until - time.time()
+
+    def expired(self) -> bool:
+        r = self.remaining()
+        return r is not None and r <= 0
+
+    def call_timeout(self, default: float | None = None) -> float:
+        default = default or settings.llm_timeout
+        r = self.remaining()
+        if r is None:
+            return default
+        if r <= 0:
+            raise DeadlineExceeded("run süre bütçesi doldu")
+        return max(1.0, min(default, r))
+
+
+LLM_BREAKER = CircuitBreaker("llm")
+LLM_LATENCY = LatencyTracker()
+_run_deadline = RunDeadline()
+
+
+def set_run_deadline(deadline: RunDeadline) -> None:
+    global _run_deadline
+    _run_deadline = deadline
+
+
+def run_deadline() -> RunDeadline:
+    return _run_deadline
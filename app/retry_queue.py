@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+
+from .config import settings
+from .metrics import METRICS
+from .models import Product
+
+RETRY, DEAD = "RETRY", "DEAD"
+
+# Kalıcı sınıflar: model ne üretirse üretsin geçemez (korunan eski açıklamadan kaynaklı)
+PERMANENT = {"protected_banned", "protected_too_long"}
+
+
+def classify_failure(report: dict) -> str:
+    """
+    validation_report_json'dan hata sınıfı. Birden çok hata varsa kalıcı olan öne geçer.
+    - protected_banned: yasaklı ifade sadece aynen korunması gereken eski açıklamada
+    - protected_too_long: eski açıklama tek başına max_chars'ı aşıyor
+    - banned / tags / length / repetition: üretimden kaynaklı, yeniden denemede düzelebilir
+    Kalıcı sınıflar sadece korunan bölümün sınırı kesinse ("Yeni ..." başlığı) verilir;
+    sınır tahminse hata yeniden denenebilir sayılır (yanlışlıkla dead-letter'a düşmesin).
+    """
+    classes = []
+    protected = report.get("protected") if report.get("protected_exact") else None
+    for err in report.get("errors", []):
+        t = err.get("type")
+        if t == "BANNED_WORDS":
+            spans = err.get("spans") or []
+            if protected and spans and all(sp.get("protected") for sp in spans):
+                classes.append("protected_banned")
+            else:
+                classes.append("banned")
+        elif t == "CHAR_COUNT":
+            if protected and protected[1] - protected[0] > err.get("max", settings.max_chars):
+                classes.append("protected_too_long")
+            else:
+                classes.append("length")
+        elif t == "DISALLOWED_TAGS":
+            classes.append("tags")
+        elif t in ("DUP_SENTENCE", "LOW_UNIQUENESS"):
+            classes.append("repetition")
+    for c in classes:
+        if c in PERMANENT:
+            return c
+    return classes[0] if classes else "unknown"
+
+
+def backoff_delay(attempt: int) -> timedelta:
+    """1. hata: base, 2.: 2*base, 3.: 4*base ... (üst sınır retry_backoff_max_s)."""
+    seconds = settings.retry_backoff_base_s * (2 ** max(0, attempt - 1))
+    return timedelta(seconds=min(seconds, settings.retry_backoff_max_s))
+
+
+def outcome_params(
+    product_id: int,
+    prev_attempts: int,
+    ok: bool,
+    report: dict | None,
+    now: datetime,
+    fallback_reason: str | None = None,
+) -> dict:
+    """
+    Ürünün son sonucuna göre kuyruk kolonları (toplu UPDATE parametresi).
+    Stub'a düşülen (devre açık, API hatası) sonuçlar altyapı kaynaklıdır: geri çekilme
+    uygulanır ama deneme sayılmaz (kalıcı sınıflar hariç; onlar hangi üreticide de geçemez).
+    Stub çıktısı doğrulamayı geçse de ürün bitmiş sayılmaz, LLM ile yeniden denenir.
+    """
+    if ok and not fallback_reason:
+        return {
+            "id": product_id, "queue_state": None, "fail_attempts": 0,
+            "next_attempt_at": None, "failure_class": None, "dead_lettered_at": None,
+        }
+    cls = "fallback" if ok else classify_failure(report or {})
+    if fallback_reason and cls not in PERMANENT:
+        return {
+            "id": product_id, "queue_state": RETRY, "fail_attempts": prev_attempts,
+            "next_attempt_at": now + backoff_delay(1), "failure_class": "fallback",
+            "dead_lettered_at": None,
+        }
+    attempts = prev_attempts + 1
+    dead = cls in PERMANENT or attempts >= settings.retry_max_attempts
+    return {
+        "id": product_id,
+        "queue_state": DEAD if dead else RETRY,
+        "fail_attempts": attempts,
+        "next_attempt_at": None if dead else now + backoff_delay(attempts),
+        "failure_class": cls,
+        "dead_lettered_at": now if dead else None,
+    }
+
+
+def record_outcomes(db, params: list[dict]) -> None:
+    if not params:
+        return
+    db.execute(update(Product), params)
+    db.commit()
+    for p in params:
+        if p["queue_state"]:
+            METRICS.inc("retry_queue_total", help="Yeniden kuyruğa / dead-letter'a alınan ürünler",
+                        state=p["queue_state"], failure_class=p["failure_class"])
+
+
+def requeue(db, failure_class: str | None = None, include_retry: bool = False) -> int:
+    """DEAD (ve istenirse RETRY) ürünleri kuyruğa geri alır: deneme sayısı ve bekleme sıfırlanır."""
+    states = [DEAD, RETRY] if include_retry else [DEAD]
+    stmt = update(Product).where(Product.queue_state.in_(states))
+    if failure_class:
+        stmt = stmt.where(Product.failure_class == failure_class)
+    res = db.execute(
+        stmt.values(
+            queue_state=None, fail_attempts=0, next_attempt_at=None, failure_class=None, dead_lettered_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return res.rowcount or 0
+
+
+def queue_summary(db) -> dict:
+    out: dict[str, dict[str, int]] = {}
+    for state, cls, n in db.execute(
+        select(Product.queue_state, Product.failure_class, func.count(Product.id))
+        .where(Product.queue_state.is_not(None))
+        .group_by(Product.queue_state, Product.failure_class)
+    ).all():
+        out.setdefault(state, {})[cls or "unknown"] = int(n)
+    return out
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+
+from .config import settings
+from .metrics import estimate_cost
+from .models import Product, Generation
+from .scheduler import category_key
+
+
+@dataclass
+class TierStats:
+    n: int = 0
+    passed: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+    input_tokens: float = 0.0
+    output_tokens: float = 0.0
+
+    def add(self, ok: bool, latency_ms: int | None, cost: float, in_tok: int, out_tok: int) -> None:
+        self.n += 1
+        self.passed += int(ok)
+        self.latency_ms += latency_ms or 0
+        self.cost_usd += cost
+        self.input_tokens += in_tok
+        self.output_tokens += out_tok
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passed / self.n if self.n else 0.0
+
+    def as_dict(self) -> dict:
+        n = self.n or 1
+        return {
+            "generations": self.n,
+            "pass_rate": round(self.pass_rate, 3),
+            "avg_latency_ms": round(self.latency_ms / n),
+            "avg_cost_usd": round(self.cost_usd / n, 6),
+        }
+
+
+def tiers_for(category_path: str | None) -> list[str]:
+    """Kategorinin kademe listesi: en uzun eşleşen LLM_CATEGORY_TIERS öneki, yoksa LLM_TIERS."""
+    best_len, best = -1, None
+    for prefix, tiers in settings.llm_category_tiers.items():
+        if category_path and category_path.startswith(prefix) and len(prefix) > best_len:
+            best_len, best = len(prefix), tiers
+    return list(best or settings.llm_tiers)
+
+
+def collect_tier_stats(db, limit: int | None = None) -> dict[tuple[str, str], TierStats]:
+    """
+    Son üretimlerden (kategori, kademe) ve ("*", kademe) başına geçme oranı / gecikme / maliyet.
+    Stub'a düşen üretimler modelin başarısını ölçmediği için sayılmaz.
+    """
+    recent = (
+        select(
+            Generation.tier,
+            Generation.model_name,
+            Generation.status,
+            Generation.latency_ms,
+            Generation.input_tokens,
+            Generation.output_tokens,
+            Generation.cached_tokens,
+            Product.category_path,
+        )
+        .join(Product, Product.id == Generation.product_id)
+        .where(Generation.tier.is_not(None), Generation.fallback_reason.is_(None))
+        .order_by(Generation.id.desc())
+        .limit(limit or settings.routing_stats_window)
+    )
+    stats: dict[tuple[str, str], TierStats] = {}
+    for tier, model, status, lat, in_tok, out_tok, cached, cat in db.execute(recent).all():
+        in_tok, out_tok = int(in_tok or 0), int(out_tok or 0)
+        cost = estimate_cost(model, in_tok, out_tok, int(cached or 0))
+        for key in ((category_key(cat), tier), ("*", tier)):
+            stats.setdefault(key, TierStats()).add(status == "PASS", lat, cost, in_tok, out_tok)
+    return stats
+
+
+@dataclass
+class Router:
+    """
+    Kademeli model yönlendirme. Kategori için kademe listesi [t0, t1, ..., tn] ve her kademenin
+    geçme oranı p, maliyeti c (gecikme ROUTING_LATENCY_USD_PER_S ile maliyete çevrilir) ile
+    i'den başlamanın beklenen maliyeti:
+        E(n) = c_n,   E(i) = c_i + (1 - p_i) * E(i+1)
+    En düşük E(i) veren kademeden başlanır; doğrulamayı geçemezse sıradakine yükseltilir.
+    Yeterli örnek yoksa ROUTING_PRIOR_PASS_RATE varsayılır; ROUTING_EXPLORE_RATE olasılıkla
+    en ucuz kademeden başlanır ki istatistikler güncel kalsın.
+    """
+
+    stats: dict[tuple[str, str], TierStats] = field(default_factory=dict)
+    rng: random.Random = field(default_factory=random.Random)
+
+    def refresh(self, db) -> None:
+        self.stats = collect_tier_stats(db)
+
+    def _estimate(self, category: str, tier: str) -> tuple[float, float]:
+        """(geçme oranı, ürün başı maliyet + gecikme karşılığı)"""
+        st = self.stats.get((category, tier))
+        if st is None or st.n < settings.routing_min_samples:
+            st = self.stats.get(("*", tier))
+        if st is not None and st.n >= settings.routing_min_samples:
+            p = st.pass_rate
+            cost = st.cost_usd / st.n
+            latency_s = st.latency_ms / st.n / 1000
+        else:
+            # Örnek yok: tüm kademelerin ortalama token'ı bu modelin fiyatıyla
+            total = [s for (c, _), s in self.stats.items() if c == "*" and s.n]
+            n = sum(s.n for s in total)
+            if n:
+                in_tok = sum(s.input_tokens for s in total) / n
+                out_tok = sum(s.output_tokens for s in total) / n
+            else:
+                in_tok = out_tok = settings.est_tokens_per_product / 2
+            p = settings.routing_prior_pass_rate
+            cost = estimate_cost(tier, int(in_tok), int(out_tok))
+            latency_s = 0.0
+        return p, cost + settings.routing_latency_usd_per_s * latency_s
+
+    def route(self, category_path: str | None) -> list[str]:
+        """Denenecek kademeler, sırayla (başlangıç kademesi + yükseltme yolu)."""
+        tiers = tiers_for(category_path)
+        if len(tiers) <= 1 or self.rng.random() < settings.routing_explore_rate:
+            return tiers
+        cat = category_key(category_path)
+        expected = [0.0] * len(tiers)
+        for i in range(len(tiers) - 1, -1, -1):
+            p, c = self._estimate(cat, tiers[i])
+            expected[i] = c if i == len(tiers) - 1 else c + (1 - p) * expected[i + 1]
+        start = min(range(len(tiers)), key=lambda i: (expected[i], i))
+        return tiers[start:]
+
+    def summary(self) -> dict:
+        return {tier: st.as_dict() for (cat, tier), st in self.stats.items() if cat == "*"}
@@ -1,19 +1,32 @@
 from __future__ import annotations
 
 import json
+import time
+from datetime import datetime
+from typing import NamedTuple
+
 from sqlalchemy import select, func
 
 from .config import settings
 from .db import SessionLocal
-from .models import Product, Generation
+from .models import Product, Generation, WorkerRun
 from .validator import Validator
-from .generator_llm import generate_html_llm
+from .generator_llm import drain_late_usage, generate_html_llm_with_meta, repair_html_llm, seal_meta
+from .metrics import METRICS, estimate_cost
+from .scheduler import Scheduler, load_work_items
+from .routing import Router
+from .length import LENGTH
+from .writer import GenerationWriter
+from .resilience import RunDeadline, set_run_deadline
+from .claims import claim_batch, complete, extend_lease, release, new_run_id, default_worker_id
+from .retry_queue import PERMANENT, classify_failure, outcome_params, record_outcomes
 
 
 def has_pass_generation(db, product_id: int) -> bool:
     q = select(func.count()).select_from(Generation).where(
         Generation.product_id == product_id,
         Generation.status == "PASS",
+        Generation.fallback_reason.is_(None),
     )
     return db.execute(q).scalar_one() > 0
 
@@ -24,54 +37,259 @@ def next_version(db, product_id: int) -> int:
     return int(v or 0) + 1
 
 
-def run_batch(limit: int | None = None, force: bool = False) -> dict:
-    validator = Validator(settings.banned_words_path)
+class ProductPayload(NamedTuple):
+    """Üretim için gereken kolonlar; ORM nesnesi / identity map girdisi oluşmaz."""
+    id: int
+    title: str
+    brand: str | None
+    category_path: str | None
+    old_description: str | None
+
+
+def load_payload(db, product_id: int) -> ProductPayload | None:
+    # Büyük metin (eski açıklama) sadece işlenen ürün için, tek satır okunur;
+    # görseller batch halinde load_work_items'ta (doğrulanmış olanlar)
+    row = db.execute(
+        select(
+            Product.id,
+            Product.title,
+            Product.brand,
+            Product.category_path,
+            Product.old_description,
+        ).where(Product.id == product_id)
+    ).first()
+    return ProductPayload(*row) if row else None
 
+
+def _start_worker_run(run_id: str, worker_id: str) -> int:
     with SessionLocal() as db:
-        products = db.execute(select(Product)).scalars().all()
-        if limit:
-            products = products[:limit]
-
-        results = {"processed": 0, "skipped": 0, "pass": 0, "fail": 0}
-
-        for p in products:
-            if (not force) and has_pass_generation(db, p.id):
-                results["skipped"] += 1
-                continue
-
-            html = generate_html_llm(
-    title=p.title,
-    brand=p.brand,
-    category_path=p.category_path,
-    old_description=p.old_description,
-    image_urls_json=p.image_urls_json
-)
-
-
-            vr = validator.validate(html)
-
-            gen = Generation(
-                product_id=p.id,
-                version=next_version(db, p.id),
-                prompt_hash=None,
-                model_name="LLM",
-                generated_html=html,
-                char_count=len(html),
-                status="PASS" if vr.ok else "FAIL",
-                validation_report_json=json.dumps(vr.report, ensure_ascii=False),
-            )
-
-            db.add(gen)
-            results["processed"] += 1
-            if vr.ok:
-                results["pass"] += 1
-            else:
-                results["fail"] += 1
+        wr = WorkerRun(run_id=run_id, worker_id=worker_id)
+        db.add(wr)
+        db.commit()
+        return wr.id
 
+
+def _finish_worker_run(worker_run_id: int, results: dict) -> None:
+    with SessionLocal() as db:
+        wr = db.get(WorkerRun, worker_run_id)
+        wr.processed = results["processed"]
+        wr.skipped = results["skipped"]
+        wr.pass_count = results["pass"]
+        wr.fail_count = results["fail"]
+        wr.deferred = results["deferred"]
+        wr.finished_at = datetime.utcnow()
         db.commit()
-        return results
+
+
+def run_batch(
+    limit: int | None = None,
+    force: bool = False,
+    run_id: str | None = None,
+    worker_id: str | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Tek worker döngüsü. Aynı DB'ye bağlı N süreç/host aynı run_id ile çalışabilir:
+    her biri claim_batch ile ayrık ürün kümeleri sahiplenir, lease'i düşen worker'ın
+    işi süre dolunca diğerlerine geçer. limit bu worker'ın işleyeceği ürün sayısıdır.
+    Sıra: priority kolonu (refresh_priorities) + Scheduler (kategori adaleti/kota, run bütçesi).
+    Model: Router (kademeli yönlendirme, doğrulama başarısızsa üst kademeye yükseltme).
+    deadline: run'ın bitmesi gereken an (time.time()); verilmezse RUN_TIME_BUDGET_S'ten.
+    Süre dolunca yeni claim yapılmaz, kalan lease'ler bırakılır; LLM zaman aşımları kalan süreye kısalır.
+    """
+    validator = Validator(settings.banned_words_path)
+    run_id = run_id or new_run_id()
+    worker_id = worker_id or default_worker_id()
+
+    run_deadline = RunDeadline(deadline) if deadline is not None else RunDeadline.from_budget(None)
+    set_run_deadline(run_deadline)
+
+    results = {
+        "processed": 0, "skipped": 0, "pass": 0, "fail": 0, "deferred": 0,
+        "budget_exhausted": False, "deadline_exceeded": False,
+    }
+    scheduler = Scheduler(run_id, force=force)
+    # Kota yüzünden ertelenenler: kategori -> ürünler. Lease'leri bırakılır (bu run'da başka worker
+    # ya da sonraki run alabilir); kategori kotanın altına inene kadar bu worker yeniden claim etmez.
+    deferred: dict[str, set[int]] = {}
+    router = Router()
+    worker_run_id = _start_worker_run(run_id, worker_id)
+
+    # Okuma bu session'dan, yazma tek yazıcı thread'inden (gruplanmış transaction'lar).
+    # Claim/complete kısa ömürlü ayrı session'larda: SQLite'ta okuma->yazma kilit yükseltmesi olmasın.
+    with SessionLocal() as db, GenerationWriter() as writer:
+        while True:
+            done = results["processed"] + results["skipped"]
+            if limit is not None and done >= limit:
+                break
+            batch_size = settings.claim_batch_size
+            if limit is not None:
+                batch_size = min(batch_size, limit - done)
+
+            if run_deadline.expired():
+                results["deadline_exceeded"] = True
+                break
+
+            scheduler.refresh(db)
+            router.refresh(db)
+            LENGTH.refresh(db)
+            if scheduler.budget_exhausted():
+                results["budget_exhausted"] = True
+                break
+
+            for cat in [c for c in deferred if not scheduler.over_quota(c)]:
+                del deferred[cat]
+            with SessionLocal() as cdb:
+                ids = claim_batch(
+                    cdb, worker_id, run_id, batch_size=batch_size, force=force,
+                    exclude=[pid for s in deferred.values() for pid in s],
+                )
+            if not ids:
+                break
+            # Lease süresinin yarısı geçince kalan ürünlerin lease'i uzatılır (yavaş batch'te
+            # başka worker aynı ürünü almasın); uzatılamayan ürün artık bizim değil, atlanır.
+            lease_renew_at = time.monotonic() + settings.lease_seconds / 2
+            owned = set(ids)
+
+            done_ids: list[int] = []
+            outcomes: list[dict] = []
+            try:
+                items = load_work_items(db, ids)
+                scheduler.observe(items)
+                for item in scheduler.order(items):
+                    pid = item.product_id
+                    if scheduler.over_quota(item.category):
+                        # Kategorinin payı doldu: tamamlanmış sayılmaz, lease bırakılır (aşağıda release)
+                        results["deferred"] += 1
+                        deferred.setdefault(item.category, set()).add(pid)
+                        continue
+                    if scheduler.budget_exhausted():
+                        results["budget_exhausted"] = True
+                        break
+                    if run_deadline.expired():
+                        results["deadline_exceeded"] = True
+                        break
+                    if time.monotonic() >= lease_renew_at:
+                        with SessionLocal() as cdb:
+                            owned = set(extend_lease(cdb, worker_id, [i for i in ids if i in owned and i not in done_ids]))
+                        lease_renew_at = time.monotonic() + settings.lease_seconds / 2
+                    if pid not in owned:
+                        continue
+
+                    if (not force) and item.has_pass:
+                        results["skipped"] += 1
+                        done_ids.append(pid)
+                        continue
+                    p = load_payload(db, pid)
+                    if p is None:
+                        continue
+
+                    # Ucuz kademeden başla; doğrulamayı geçemezse bir üst kademeye yükselt.
+                    # Her deneme ayrı versiyon olarak yazılır (kademe istatistikleri bunlardan çıkar).
+                    version = item.next_version
+                    tiers = router.route(p.category_path)
+                    for i, tier in enumerate(tiers):
+                        html, meta = generate_html_llm_with_meta(
+                            title=p.title,
+                            brand=p.brand,
+                            category_path=p.category_path,
+                            old_description=p.old_description,
+                            image_urls_json=item.image_urls_json,
+                            model=tier,
+                        )
+
+                        with METRICS.stage("validation"):
+                            vr = validator.validate(html)
+                        # Kalıcı hata (korunan eski açıklamadan): onarım da üst kademe de düzeltemez
+                        permanent = not vr.ok and classify_failure(vr.report) in PERMANENT
+                        if not vr.ok and not meta.fallback_reason and not permanent:
+                            # Önce hedefli onarım (sadece sorunlu bloklar), olmazsa üst kademe
+                            html, vr = repair_html_llm(html, vr, validator, tier, meta)
+
+                        seal_meta(meta)
+                        writer.submit({
+                            "product_id": p.id,
+                            "version": version,
+                            "prompt_hash": None,
+                            "model_name": meta.model,
+                            "generated_html": html,
+                            "char_count": len(html),
+                            "status": "PASS" if vr.ok else "FAIL",
+                            "validation_report_json": json.dumps(vr.report, ensure_ascii=False),
+                            "run_id": run_id,
+                            "latency_ms": int(meta.latency_s * 1000),
+                            "input_tokens": meta.input_tokens,
+                            "output_tokens": meta.output_tokens,
+                            "cached_tokens": meta.cached_tokens,
+                            "retry_count": meta.retry_count,
+                            "fallback_reason": meta.fallback_reason,
+                            "tier": tier,
+                            "expansion_calls": meta.expansion_calls,
+                            "truncated_chars": meta.truncated_chars,
+                            "calib_chars": meta.calib_chars or None,
+                            "calib_tokens": meta.calib_tokens or None,
+                        })
+                        version += 1
+                        METRICS.inc("generations_total", help="Üretilen Generation sayısı", status="PASS" if vr.ok else "FAIL")
+                        scheduler.charge(
+                            meta.input_tokens,
+                            meta.output_tokens,
+                            estimate_cost(meta.model, meta.input_tokens, meta.output_tokens, meta.cached_tokens),
+                        )
+                        # Satır yazıldıktan sonra biten kaybeden hedge çağrıları da bütçeden düşer
+                        scheduler.charge(*drain_late_usage())
+
+                        # Kalıcı hatada ya da stub'a düştüyse üst kademe de aynı sorunla karşılaşır; bütçe/süre bittiyse dur.
+                        if vr.ok or permanent or meta.fallback_reason or i == len(tiers) - 1:
+                            break
+                        if scheduler.budget_exhausted() or run_deadline.expired():
+                            break
+                        METRICS.inc("llm_escalations_total", help="Üst kademeye yükseltilen üretimler", tier=tier)
+
+                    scheduler.mark_served(item.category)
+                    done_ids.append(pid)
+                    # FAIL: sınıflandır, geri çekilmeyle yeniden kuyruğa al ya da dead-letter'a taşı
+                    outcomes.append(outcome_params(
+                        pid, item.fail_attempts, vr.ok, vr.report, datetime.utcnow(), meta.fallback_reason,
+                    ))
+                    results["processed"] += 1
+                    if vr.ok:
+                        results["pass"] += 1
+                    else:
+                        results["fail"] += 1
+
+                # Lease'i bırakmadan önce satırlar gerçekten yazılmış olsun.
+                writer.flush()
+            except BaseException:
+                with SessionLocal() as cdb:
+                    release(cdb, worker_id, ids)
+                raise
+
+            with SessionLocal() as cdb:
+                completed = set(complete(cdb, worker_id, run_id, done_ids))
+                if len(completed) < len(done_ids):
+                    # Lease bu arada başka worker'a geçmiş: kuyruk durumunu o worker yazar
+                    METRICS.inc("lease_lost_total", len(done_ids) - len(completed),
+                                help="İşlenirken lease'i başka worker'a geçen ürünler")
+                record_outcomes(cdb, [o for o in outcomes if o["id"] in completed])
+                # Ertelenen / bütçe / süre yüzünden işlenmeyenler başkasına / sonraki run'a kalsın
+                release(cdb, worker_id, [i for i in ids if i not in set(done_ids)])
+
+            if results["budget_exhausted"] or results["deadline_exceeded"]:
+                break
+
+            # Okuma snapshot'ını ve identity map'i bırak (WAL checkpoint'i tutmasın, bellek büyümesin).
+            db.rollback()
+            db.expunge_all()
+
+    _finish_worker_run(worker_run_id, results)
+    return {**results, "run_id": run_id, "worker_id": worker_id}
 
 
 if __name__ == "__main__":
     # modül olarak değil direkt çalıştırırsan da çalışsın diye
+    from .scheduler import refresh_priorities
+
+    with SessionLocal() as _db:
+        refresh_priorities(_db)
     print(run_batch(limit=None, force=False))
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, update
+
+from .config import settings
+from .metrics import estimate_cost
+from .models import Product, Generation
+
+
+def category_key(category_path: str | None, depth: int | None = None) -> str:
+    """'Giyim > Spor > Tayt' -> depth=1: 'Giyim', depth=2: 'Giyim > Spor'"""
+    if not category_path:
+        return "-"
+    parts = [p.strip() for p in category_path.split(">") if p.strip()]
+    return " > ".join(parts[: depth or settings.category_depth]) or "-"
+
+
+def _category_weight(category_path: str | None, weights: dict[str, float]) -> float:
+    # En uzun eşleşen önek kazanır ("Giyim > Spor" > "Giyim").
+    if not category_path or not weights:
+        return 0.0
+    best_len, best = -1, 0.0
+    for prefix, w in weights.items():
+        if category_path.startswith(prefix) and len(prefix) > best_len:
+            best_len, best = len(prefix), float(w)
+    return best
+
+
+def score(
+    old_desc_len: int | None,
+    category_path: str | None,
+    updated_at: datetime | None,
+    fail_count: int,
+    now: datetime | None = None,
+) -> float:
+    """Tek ürünün öncelik skoru; sinyal ağırlıkları settings'ten gelir."""
+    now = now or datetime.utcnow()
+    s = 0.0
+    if not old_desc_len:
+        s += settings.priority_weight_missing_desc
+    elif old_desc_len < settings.priority_short_desc_chars:
+        s += settings.priority_weight_short_desc
+    if updated_at and updated_at >= now - timedelta(days=settings.priority_recent_days):
+        s += settings.priority_weight_recent
+    s += _category_weight(category_path, settings.priority_category_weights)
+    s -= settings.priority_weight_fail * fail_count
+    return round(s, 4)
+
+
+def refresh_priorities(db) -> int:
+    """
+    PASS'i olmayan ürünlerin priority kolonunu yeniden hesaplar.
+    Büyük metinler yüklenmez: eski açıklamanın sadece uzunluğu SQL'de alınır.
+    claim_batch bu kolona göre sıralar -> tüm worker'lar için ortak öncelik kuyruğu.
+    """
+    fails = (
+        select(Generation.product_id, func.count(Generation.id).label("n"))
+        .where(Generation.status == "FAIL")
+        .group_by(Generation.product_id)
+        .subquery()
+    )
+    has_pass = (
+        select(Generation.id)
+        .where(Generation.product_id == Product.id, Generation.status == "PASS", Generation.fallback_reason.is_(None))
+        .exists()
+    )
+    rows = db.execute(
+        select(
+            Product.id,
+            func.length(func.trim(func.coalesce(Product.old_description, ""))),
+            Product.category_path,
+            Product.updated_at,
+            func.coalesce(fails.c.n, 0),
+        )
+        .outerjoin(fails, fails.c.product_id == Product.id)
+        .where(~has_pass)
+    ).all()
+
+    now = datetime.utcnow()
+    params = [
+        {"id": pid, "priority": score(dlen, cat, upd, int(nfail), now)}
+        for pid, dlen, cat, upd, nfail in rows
+    ]
+    if params:
+        db.execute(update(Product), params)
+    db.commit()
+    return len(params)
+
+
+@dataclass(slots=True)
+class WorkItem:
+    """Claim edilen ürünün hafif kaydı (ORM nesnesi değil; ürün başına birkaç düzine bayt)."""
+    product_id: int
+    category: str
+    priority: float
+    category_path: str | None = None
+    has_pass: bool = False
+    next_version: int = 1
+    fail_attempts: int = 0
+    # Eklenecek görseller: sadece doğrulanmış olanlar (inline_images kapalıysa None)
+    image_urls_json: str | None = None
+
+
+@dataclass
+class Scheduler:
+    """
+    Bir worker'ın run içi zamanlayıcısı:
+    - claim edilen ürünleri öncelik kuyruğundan (heap) verir; çok işlenmiş kategorinin
+      efektif önceliği fairness_weight * payı kadar düşer (kategori adaleti)
+    - kategori kotaları (sabit adet / azami pay) aşılırsa ürünü bu run için erteler; azami pay
+      başka bir kategoride bekleyen iş olduğu sürece uygulanır (tek kategori varsa sınır yok)
+    - token / maliyet bütçesi: run genelinde (tüm worker'lar) harcananı DB'den okur,
+      sıradaki ürünün tahmini maliyeti bütçeyi aşacaksa durdurur
+    """
+
+    run_id: str
+    force: bool = False  # force'ta PASS'i olan ürünler de bekleyen iş sayılır
+    token_budget: int = field(default_factory=lambda: settings.run_token_budget)
+    cost_budget_usd: float = field(default_factory=lambda: settings.run_cost_budget_usd)
+    quotas: dict[str, int] = field(default_factory=lambda: dict(settings.category_quotas))
+    max_share: float = field(default_factory=lambda: settings.category_max_share)
+    fairness_weight: float = field(default_factory=lambda: settings.fairness_weight)
+
+    served: dict[str, int] = field(default_factory=dict)
+    # Bu run'da henüz tamamlanmamış, işlenmesi gereken ürün sayısı (kategori bazında)
+    pending: dict[str, int] = field(default_factory=dict)
+    spent_tokens: int = 0
+    spent_usd: float = 0.0
+    est_tokens: float = field(default_factory=lambda: float(settings.est_tokens_per_product))
+    est_usd: float = 0.0
+
+    def refresh(self, db) -> None:
+        """Run geneli harcama + kategori sayıları (diğer worker'lar dahil) ve ürün başı tahmin."""
+        usage = db.execute(
+            select(
+                Generation.model_name,
+                func.coalesce(func.sum(Generation.input_tokens), 0),
+                func.coalesce(func.sum(Generation.output_tokens), 0),
+                func.coalesce(func.sum(Generation.cached_tokens), 0),
+            )
+            .where(Generation.run_id == self.run_id)
+            .group_by(Generation.model_name)
+        ).all()
+        self.spent_tokens = sum(int(i) + int(o) for _, i, o, _ in usage)
+        self.spent_usd = sum(estimate_cost(m, int(i), int(o), int(c)) for m, i, o, c in usage)
+
+        served: dict[str, int] = {}
+        for cat, n in db.execute(
+            # Kademe yükseltmesiyle ürün başına birden çok generation olabilir: ürün say
+            select(Product.category_path, func.count(func.distinct(Generation.product_id)))
+            .join(Generation, Generation.product_id == Product.id)
+            .where(Generation.run_id == self.run_id)
+            .group_by(Product.category_path)
+        ).all():
+            k = category_key(cat)
+            served[k] = served.get(k, 0) + int(n)
+        self.served = served
+
+        # Bekleyen iş: şu an claim edilebilecek ürünler (claim_batch ile aynı koşul: geri çekilmede
+        # bekleyen / başka worker'da lease'li olanlar sayılmaz, yoksa kota boşuna erteler)
+        from .claims import _pending_filter
+
+        pending: dict[str, int] = {}
+        for cat, n in db.execute(
+            select(Product.category_path, func.count(Product.id))
+            .where(_pending_filter(self.run_id, self.force, datetime.utcnow()))
+            .group_by(Product.category_path)
+        ).all():
+            k = category_key(cat)
+            pending[k] = pending.get(k, 0) + int(n)
+        self.pending = pending
+
+        # Ürün başı tahmin: son gerçek LLM üretimlerinin ortalaması
+        recent = (
+            select(Generation.model_name, Generation.input_tokens, Generation.output_tokens, Generation.cached_tokens)
+            .where(Generation.input_tokens > 0)
+            .order_by(Generation.id.desc())
+            .limit(200)
+            .subquery()
+        )
+        rows = db.execute(select(recent)).all()
+        if rows:
+            self.est_tokens = sum(int(r[1]) + int(r[2]) for r in rows) / len(rows)
+            self.est_usd = sum(estimate_cost(r[0], int(r[1]), int(r[2]), int(r[3] or 0)) for r in rows) / len(rows)
+
+    def budget_exhausted(self) -> bool:
+        if self.token_budget and self.spent_tokens + self.est_tokens > self.token_budget:
+            return True
+        if self.cost_budget_usd and self.spent_usd + self.est_usd > self.cost_budget_usd:
+            return True
+        return False
+
+    def charge(self, input_tokens: int, output_tokens: int, cost_usd: float) -> None:
+        self.spent_tokens += input_tokens + output_tokens
+        self.spent_usd += cost_usd
+
+    def observe(self, items: list[WorkItem]) -> None:
+        """Claim edilen batch'teki kategoriler de bekleyen iş sayılır (refresh'ten sonra claim edilmiş olabilir)."""
+        batch: dict[str, int] = {}
+        for it in items:
+            batch[it.category] = batch.get(it.category, 0) + 1
+        for cat, n in batch.items():
+            self.pending[cat] = max(self.pending.get(cat, 0), n)
+
+    def over_quota(self, category: str) -> bool:
+        n = self.served.get(category, 0)
+        cap = self.quotas.get(category)
+        if cap is not None and n >= cap:
+            return True
+        if self.max_share >= 1.0:
+            return False
+        # Azami pay sadece başka kategoride bekleyen iş varken anlamlı (yoksa ertelemek boşa bekletir);
+        # aktif kategori sayısına göre ulaşılabilir olmalı: en az 1 / aktif kategori
+        active = {c for c, m in self.pending.items() if m > 0} | {category}
+        if len(active) < 2:
+            return False
+        share = max(self.max_share, 1.0 / len(active))
+        total = sum(self.served.values())
+        return n + 1 > math.ceil(share * (total + 1))
+
+    def mark_served(self, category: str) -> None:
+        self.served[category] = self.served.get(category, 0) + 1
+        if self.pending.get(category, 0) > 0:
+            self.pending[category] -= 1
+
+    def _effective(self, item: WorkItem) -> float:
+        total = sum(self.served.values())
+        share = self.served.get(item.category, 0) / total if total else 0.0
+        return item.priority - self.fairness_weight * share
+
+    def order(self, items: list[WorkItem]):
+        """
+        Öncelik kuyruğu: en yüksek efektif öncelik önce. served her adımda değiştiği için
+        tembel yeniden değerlendirme: çekilen öğenin skoru eskidiyse geri itilir.
+        """
+        tie = itertools.count()
+        heap = [(-self._effective(it), next(tie), it) for it in items]
+        heapq.heapify(heap)
+        while heap:
+            neg, _, it = heapq.heappop(heap)
+            current = -self._effective(it)
+            if heap and current > heap[0][0] + 1e-9:
+                heapq.heappush(heap, (current, next(tie), it))
+                continue
+            yield it
+
+
+def load_work_items(db, product_ids: list[int], with_images: bool | None = None) -> list[WorkItem]:
+    """
+    Claim edilen ürünlerin sadece küçük kolonları + generation özeti (PASS var mı, sıradaki
+    versiyon) tek sorguda; büyük metinler ürün işlenirken ayrıca ve tek tek okunur.
+    Görseller eklenecekse (inline_images) batch'in doğrulanmış görselleri de tek IN sorgusuyla.
+    """
+    from .images import verified_image_map
+
+    with_images = settings.inline_images if with_images is None else with_images
+    gens = (
+        select(
+            Generation.product_id.label("pid"),
+            func.max(Generation.version).label("v"),
+            func.count(Generation.id)
+            .filter(Generation.status == "PASS", Generation.fallback_reason.is_(None))
+            .label("n_pass"),
+        )
+        .where(Generation.product_id.in_(product_ids))
+        .group_by(Generation.product_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            Product.id, Product.category_path, Product.priority, gens.c.v, gens.c.n_pass, Product.fail_attempts,
+        )
+        .outerjoin(gens, gens.c.pid == Product.id)
+        .where(Product.id.in_(product_ids))
+    ).all()
+    images: dict[int, str | None] = {}
+    if with_images:
+        images = verified_image_map(
+            db,
+            dict(db.execute(select(Product.id, Product.image_urls_json).where(Product.id.in_(product_ids))).all()),
+        )
+    return [
+        WorkItem(
+            pid, category_key(cat), float(prio or 0.0), cat, bool(n_pass), int(v or 0) + 1, int(attempts or 0),
+            images.get(pid),
+        )
+        for pid, cat, prio, v, n_pass, attempts in rows
+    ]
@@ -22,6 +22,95 @@ def _normalize_text(s: str) -> str:
     return s
 
 
+# Eski açıklama bölümü aynen korunur: onarım buraya dokunmaz, etiket kontrolü burayı atlar.
+PROTECTED_HEADING = "Mevcut Ürün Açıklaması"
+# Bölümün kesin sonu: üretilen içeriğin "Yeni ..." başlığı (üreticiler bunu garanti eder)
+_PROTECTED_END_RE = re.compile(r"<strong>\s*Yeni\b", re.IGNORECASE)
+# "Yeni" başlığı yoksa: üretilen bölümlerin bilinen ilk başlığına kadar her şey korunur (kesin değil)
+_GENERATED_HEADING_RE = re.compile(
+    r"<strong>\s*(?:Ürün Genel Tanımı|Kullanım Alanları|Öne Çıkan|Sık Sorulan|Ürün Görselleri)",
+    re.IGNORECASE,
+)
+_TAG_RE = re.compile(r"<\s*/?\s*([a-zA-Z][a-zA-Z0-9]*)[^>]*>")
+# Blok sınırları: başlık / liste öncesi, satır sonu / liste öğesi sonrası
+_BLOCK_BOUNDARY_RE = re.compile(r"(?=<strong>)|(?=<ul>)|(?=<li>)|(?<=<br/>)|(?<=</li>)|(?<=</ul>)")
+_SENTENCE_SPLIT_RE = re.compile(r"[.!?]\s+")
+
+
+def protected_bounds(html: str) -> tuple[tuple[int, int] | None, bool]:
+    """
+    'Mevcut Ürün Açıklaması' bölümünün [başlangıç, bitiş) aralığı (yoksa None) ve bitişin
+    kesin olup olmadığı. Eski açıklamanın içindeki boş satırlar bölümü bitirmez.
+    """
+    start = html.find(f"<strong>{PROTECTED_HEADING}</strong>")
+    if start < 0:
+        return None, False
+    m = _PROTECTED_END_RE.search(html, start + 1)
+    if m:
+        return (start, m.start()), True
+    m = _GENERATED_HEADING_RE.search(html, start + 1)
+    return (start, m.start() if m else len(html)), False
+
+
+def protected_span(html: str) -> tuple[int, int] | None:
+    return protected_bounds(html)[0]
+
+
+def split_blocks(html: str) -> list[tuple[int, int]]:
+    """HTML'i paragraf/madde düzeyinde bloklara böler: [(start, end), ...]."""
+    cuts = sorted({0, len(html), *(m.start() for m in _BLOCK_BOUNDARY_RE.finditer(html))})
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if html[a:b].strip()]
+
+
+def truncate_html(html: str, max_chars: int) -> str:
+    """
+    max_chars'a blok sınırında kırpar (etiket ortasından kesmez, "..." eklemez):
+    sondaki görsel bölümü korunur, açık kalan <ul> kapatılır. Korunan eski açıklama
+    bölümü hiçbir zaman kesilmez (tek başına sığmıyorsa sonuç max_chars'ı aşabilir).
+    """
+    if len(html) <= max_chars:
+        return html
+    i = html.find("<strong>Ürün Görselleri")
+    body, tail = (html[:i], html[i:]) if i >= 0 else (html, "")
+    if len(tail) >= max_chars:
+        body, tail = html, ""
+    budget = max_chars - len(tail)
+
+    # Korunan bölüm (ve öncesi) bütün halde kalır; kırpma sadece sonrasında
+    span = protected_span(body)
+    keep = span[1] if span else 0
+    head, rest = body[:keep], body[keep:]
+
+    out = ""
+    for a, b in split_blocks(rest):
+        piece = rest[a:b]
+        opened = (out + piece).count("<ul>") - (out + piece).count("</ul>")
+        if len(head) + len(out) + len(piece) + len("</ul>") * max(opened, 0) > budget:
+            break
+        out += piece
+    room = budget - len(head)
+    if not out and room > 0:
+        # Sınır yok (tek parça metin): son etiket / cümle sonunda kes
+        out = rest[:room]
+        if out.rfind("<") > out.rfind(">"):
+            out = out[: out.rfind("<")]
+        dot = out.rfind(". ")
+        if dot > room // 2:
+            out = out[: dot + 1]
+    # Sonda içeriksiz kalan başlık / açılmış liste bırakma
+    while True:
+        trimmed = re.sub(r"(?:<ul>\s*|<strong>[^<]*</strong>\s*(?:<br/>\s*)?)$", "", out)
+        if trimmed == out:
+            break
+        out = trimmed
+    opened = out.count("<ul>") - out.count("</ul>")
+    return head + out + "</ul>" * max(opened, 0) + tail
+
+
+def _in_span(pos: int, span: tuple[int, int] | None) -> bool:
+    return span is not None and span[0] <= pos < span[1]
+
+
 @dataclass
 class ValidationResult:
     ok: bool
@@ -35,18 +124,74 @@ class Validator:
     - repetition:
         * herhangi bir cümle 10+ kez geçerse FAIL
         * benzersiz cümle oranı çok düşükse FAIL (spam yakalama)
+    - disallowed tags: settings.allowed_tags dışındaki etiketler (korunan eski açıklama hariç)
+
+    Rapor onarım için konum bilgisi de taşır: yasaklı kelime offset'leri, tekrar eden
+    cümle kümeleri (geçtikleri bloklar) ve izinsiz etiketlerin yerleri.
     """
     def __init__(self, banned_words_path: str):
         self.banned_words = _load_banned_words(banned_words_path)
         self.banned_norm = [_normalize_text(w) for w in self.banned_words]
+        # Ham HTML üzerinde offset bulmak için: kelime arası boşluk esnek, büyük/küçük harf duyarsız
+        self.banned_patterns = [
+            (bw, re.compile(r"\s+".join(re.escape(p) for p in bw.split()), re.IGNORECASE))
+            for bw in self.banned_norm if bw
+        ]
+        self.allowed_tags = {t.lower() for t in settings.allowed_tags}
 
         # Stub ile ilerlemek için makul eşikler:
         self.max_sentence_repeat = 200          # aynı cümle 10+ kez -> FAIL
         self.min_unique_sentence_ratio = 0.01  # benzersiz/total < %10 -> FAIL
 
+    def banned_spans(self, html: str, protected: tuple[int, int] | None = None) -> list[dict]:
+        spans = []
+        for bw, pat in self.banned_patterns:
+            for m in pat.finditer(html):
+                spans.append({
+                    "word": bw,
+                    "start": m.start(),
+                    "end": m.end(),
+                    "protected": _in_span(m.start(), protected),
+                })
+        return sorted(spans, key=lambda x: x["start"])
+
+    def disallowed_tag_spans(self, html: str, protected: tuple[int, int] | None = None) -> list[dict]:
+        return [
+            {"tag": m.group(1).lower(), "start": m.start(), "end": m.end()}
+            for m in _TAG_RE.finditer(html)
+            if m.group(1).lower() not in self.allowed_tags and not _in_span(m.start(), protected)
+        ]
+
+    def check_fragment(self, fragment: str) -> list[dict]:
+        """Onarılan tek bir parçanın yerel kontrolü (yasaklı kelime + etiket); tüm belge doğrulanmadan önce."""
+        errors = []
+        hits = sorted({s["word"] for s in self.banned_spans(fragment)})
+        if hits:
+            errors.append({"type": "BANNED_WORDS", "hits": hits})
+        tags = sorted({s["tag"] for s in self.disallowed_tag_spans(fragment)})
+        if tags:
+            errors.append({"type": "DISALLOWED_TAGS", "tags": tags})
+        return errors
+
+    def duplicate_clusters(self, html: str, limit: int = 20) -> list[dict]:
+        """Birden çok blokta geçen cümleler ve geçtikleri blokların aralıkları."""
+        where: dict[str, list[tuple[int, int]]] = {}
+        for a, b in split_blocks(html):
+            text = _normalize_text(re.sub(r"<[^>]+>", " ", html[a:b]))
+            for sent in {x.strip() for x in _SENTENCE_SPLIT_RE.split(text) if len(x.strip()) > 20}:
+                where.setdefault(sent, []).append((a, b))
+        clusters = [
+            {"sentence": sent[:120], "count": len(spans), "spans": [list(sp) for sp in spans]}
+            for sent, spans in where.items()
+            if len(spans) > 1
+        ]
+        clusters.sort(key=lambda c: c["count"], reverse=True)
+        return clusters[:limit]
+
     def validate(self, html: str) -> ValidationResult:
         text = re.sub(r"<[^>]+>", " ", html)
         normalized_text = _normalize_text(text)
+        protected, protected_exact = protected_bounds(html)
 
         errors = []
 
@@ -56,7 +201,11 @@ class Validator:
             if bw and bw in normalized_text:
                 hits.append(bw)
         if hits:
-            errors.append({"type": "BANNED_WORDS", "hits": sorted(set(hits))})
+            errors.append({
+                "type": "BANNED_WORDS",
+                "hits": sorted(set(hits)),
+                "spans": self.banned_spans(html, protected)[:200],
+            })
 
         # 2) Karakter sayısı kontrolü
         char_count = len(html)
@@ -71,10 +220,11 @@ class Validator:
         # 3) Tekrar kontrolü (cümle frekansı + benzersizlik oranı)
         sentences = [
             s.strip()
-            for s in re.split(r"[.!?]\s+", normalized_text)
+            for s in _SENTENCE_SPLIT_RE.split(normalized_text)
             if len(s.strip()) > 20
         ]
 
+        dup_failed = False
         if sentences:
             counts = Counter(sentences)
             max_rep = max(counts.values())
@@ -89,6 +239,7 @@ class Validator:
                     "threshold": self.max_sentence_repeat,
                     "examples": [f"{s[:120]} (x{c})" for s, c in worst]
                 })
+                dup_failed = True
 
             if unique_ratio < self.min_unique_sentence_ratio:
                 errors.append({
@@ -96,9 +247,25 @@ class Validator:
                     "unique_ratio": round(unique_ratio, 4),
                     "threshold": self.min_unique_sentence_ratio
                 })
+                dup_failed = True
+
+        # 4) İzin verilmeyen etiketler
+        bad_tags = self.disallowed_tag_spans(html, protected)
+        if bad_tags:
+            errors.append({
+                "type": "DISALLOWED_TAGS",
+                "tags": sorted({t["tag"] for t in bad_tags}),
+                "spans": bad_tags[:200],
+            })
 
         ok = len(errors) == 0
         report = {"ok": ok, "errors": errors, "char_count": char_count}
+        if protected:
+            report["protected"] = list(protected)
+            report["protected_exact"] = protected_exact
+        if dup_failed:
+            # Onarım: aynı cümlenin ilk geçişi kalır, diğer bloklar yeniden yazılır
+            report["dup_clusters"] = self.duplicate_clusters(html)
         return ValidationResult(ok=ok, report=report)
 
     @staticmethod
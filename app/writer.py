@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from .config import settings
+from .db import SessionLocal
+from .metrics import METRICS
+from .models import Generation
+
+_STOP = object()
+_FLUSH = object()  # bekleyenleri flush_interval'ı beklemeden hemen yaz
+
+
+class GenerationWriter:
+    """
+    Tek yazıcı kuyruğu:
+    - Üretim thread'leri satırları submit() ile kuyruğa atar, DB'yi beklemez.
+    - Tek bir arka plan thread'i satırları batch_size / flush_interval'a göre
+      gruplayıp tek transaction'da insert eder (her Generation için ayrı commit/fsync yok).
+    - Okuyucular (WAL sayesinde) bu sırada paralel ilerler.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.writer_batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else settings.writer_flush_interval
+        self.written = 0
+        self.transactions = 0
+        self._q: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._error: BaseException | None = None
+
+    def start(self) -> "GenerationWriter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="generation-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, row: dict) -> None:
+        self._raise_if_failed()
+        self._q.put(row)
+
+    def flush(self) -> None:
+        # Yazıcıyı hemen uyandır ve kuyruktaki her şey yazılana kadar bekle.
+        if self._thread is not None:
+            self._q.put(_FLUSH)
+        self._q.join()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._q.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._raise_if_failed()
+
+    def __enter__(self) -> "GenerationWriter":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("GenerationWriter yazma hatası") from self._error
+
+    def _run(self) -> None:
+        pending: list[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+
+        while not stop:
+            timeout = max(0.0, deadline - time.monotonic())
+            flush = False
+            try:
+                item = self._q.get(timeout=timeout)
+                if item is _STOP:
+                    stop = True
+                    self._q.task_done()
+                elif item is _FLUSH:
+                    flush = True
+                else:
+                    pending.append(item)
+            except queue.Empty:
+                pass
+
+            if pending and (stop or flush or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(pending)
+                for _ in pending:
+                    self._q.task_done()
+                pending = []
+            if flush:
+                self._q.task_done()
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, rows: list[dict]) -> None:
+        if self._error is not None:
+            return
+        try:
+            with METRICS.stage("db_commit"), self.session_factory() as db:
+                db.execute(insert(Generation), rows)
+                db.commit()
+            self.written += len(rows)
+            self.transactions += 1
+        except BaseException as e:  # pragma: no cover - thread içinde yakalanıp close/flush'ta yükseltilir
+            self._error = e
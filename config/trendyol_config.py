@@ -1,5 +1,8 @@
-API_KEY = "uJwYgXpN4rnpaqTn4Smx"
-API_SECRET = "A8liW9oWx3TjI0ydbH45"
-SUPPLIER_ID = "900348"
-BASE_URL = "https://apigw.trendyol.com/integration"
+import os
+
+API_KEY = os.getenv("TRENDYOL_API_KEY", "uJwYgXpN4rnpaqTn4Smx")
+API_SECRET = os.getenv("TRENDYOL_API_SECRET", "A8liW9oWx3TjI0ydbH45")
+SUPPLIER_ID = os.getenv("TRENDYOL_SUPPLIER_ID", "900348")
+# Testlerde yerel stub sunucuya yönlendirmek için: TRENDYOL_BASE_URL=http://127.0.0.1:8099/integration
+BASE_URL = os.getenv("TRENDYOL_BASE_URL", "https://apigw.trendyol.com/integration")
 
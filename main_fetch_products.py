@@ -1,7 +1,8 @@
-import time
+import argparse
 import os
-import pandas as pd
-from services.trendyol_api import fetch_all_products
+from app.profiling import add_profile_args, profiler_from_args
+
+# pandas / requests / openai sadece ilgili aşama çalışırken yüklenir (--help anında döner).
 
 def normalize(products):
     rows = []
@@ -17,52 +18,67 @@ def normalize(products):
 
     return rows
 
-if __name__ == "__main__":
-    products = fetch_all_products()
-    rows = normalize(products)
-
-    df = pd.DataFrame(rows)
-    df.to_excel("outputs/products_raw.xlsx", index=False)
 
-    print(f"{len(df)} ürün Excel'e yazıldı")
-import pandas as pd
-from services.ai_description import generate_description
-
-if __name__ == "__main__":
-    df = pd.read_excel("outputs/products_raw.xlsx")
+def fetch_stage(prof):
+    import pandas as pd
+    from services.trendyol_api import fetch_all_products
 
-    # TEK ÜRÜN (örnek: ilk satır)
-    row = df.iloc[0].to_dict()
+    with prof.stage("fetch"):
+        products = fetch_all_products()
+    with prof.stage("normalize"):
+        rows = normalize(products)
+        df = pd.DataFrame(rows)
+    with prof.stage("export_raw"):
+        df.to_excel("outputs/products_raw.xlsx", index=False)
 
-    new_desc = generate_description(row)
-    df.loc[0, "new_description"] = new_desc
+    print(f"{len(df)} ürün Excel'e yazıldı")
 
-    df.to_excel("outputs/products_with_ai_test.xlsx", index=False)
-    print("Tek ürün için new_description yazıldı.")
-import pandas as pd
-from services.ai_description import generate_with_retry
 
-if __name__ == "__main__":
-    df = pd.read_excel("outputs/products_raw.xlsx")
+def ai_test_stage(prof):
+    import pandas as pd
+    from services.ai_description import generate_description
 
-    if "new_description" not in df.columns:
-        df["new_description"] = ""
-    if "ai_status" not in df.columns:
-        df["ai_status"] = ""
+    with prof.stage("ai_test"):
+        df = pd.read_excel("outputs/products_raw.xlsx")
 
-    for idx, row in df.iterrows():
-        product = row.to_dict()
+        # TEK ÜRÜN (örnek: ilk satır)
+        row = df.iloc[0].to_dict()
 
-        new_desc, status = generate_with_retry(product)
-        df.at[idx, "new_description"] = new_desc
-        df.at[idx, "ai_status"] = status
+        new_desc = generate_description(row)
+        df.loc[0, "new_description"] = new_desc
 
-        print(f"{idx+1}/{len(df)} -> {status}")
+        df.to_excel("outputs/products_with_ai_test.xlsx", index=False)
+    print("Tek ürün için new_description yazıldı.")
 
-        time.sleep(6)   # <-- TAM OLARAK BURAYA
-                        #     (for döngüsünün EN SON SATIRI)
 
-    df.to_excel("outputs/products_with_ai.xlsx", index=False)
+def ai_batch_stage(prof, concurrency=None, rpm=None, retry_failed=False):
+    from services.ai_batch import DEFAULT_CONCURRENCY, DEFAULT_RPM, run_ai_batch
+
+    # Eşzamanlı + hız limitli; sonuçlar checkpoint'e anında yazılır, yeniden
+    # çalıştırmada tamamlanmış barkodlar atlanır. Excel checkpoint'ten üretilir.
+    with prof.stage("ai_batch"):
+        stats = run_ai_batch(
+            raw_path="outputs/products_raw.xlsx",
+            out_path="outputs/products_with_ai.xlsx",
+            concurrency=concurrency or DEFAULT_CONCURRENCY,
+            rpm=rpm or DEFAULT_RPM,
+            retry_failed=retry_failed,
+        )
+    print(stats)
     print("Batch tamamlandı: outputs/products_with_ai.xlsx")
 
 
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    add_profile_args(ap)
+    ap.add_argument("--concurrency", type=int, default=None, help="eşzamanlı istek sayısı (AI_BATCH_CONCURRENCY)")
+    ap.add_argument("--rpm", type=float, default=None, help="dakikalık azami API isteği (AI_BATCH_RPM)")
+    ap.add_argument("--retry-failed", action="store_true", help="checkpoint'te FAIL olanları da yeniden üret")
+    ap.add_argument("--skip-fetch", action="store_true", help="outputs/products_raw.xlsx mevcutsa API'den çekme")
+    args = ap.parse_args()
+
+    with profiler_from_args(args) as prof:
+        if not (args.skip_fetch and os.path.exists("outputs/products_raw.xlsx")):
+            fetch_stage(prof)
+            ai_test_stage(prof)
+        ai_batch_stage(prof, args.concurrency, args.rpm, args.retry_failed)
@@ -0,0 +1,162 @@
+"""
+Kısa açıklama (services.ai_description) için eşzamanlı, checkpoint'li toplu çalıştırma.
+
+- Sınırlı sayıda thread, dakikalık istek limiti (token bucket) ile API'ye gider.
+- Her ürünün sonucu bittiği anda JSONL checkpoint'e eklenir: çökme / Ctrl-C sonrası
+  yeniden çalıştırmada tamamlanmış barkodlar atlanır.
+- Son Excel ham Excel + checkpoint birleştirilerek üretilir.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+DEFAULT_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4"))
+DEFAULT_RPM = float(os.getenv("AI_BATCH_RPM", "60"))
+
+
+class RateLimiter:
+    """Thread-safe token bucket: dakikada en fazla rpm istek, burst kadar ani çıkış."""
+
+    def __init__(self, rpm: float, burst: int = 1):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) * self.interval
+            time.sleep(wait_s)
+
+
+def _key(product: dict, idx: int) -> str:
+    barcode = product.get("barcode")
+    if barcode is None or (isinstance(barcode, float) and barcode != barcode):  # NaN
+        return f"#row{idx}"
+    return str(barcode)
+
+
+def load_checkpoint(path: str) -> dict[str, dict]:
+    """barkod -> son kayıt. Yarım yazılmış son satır (çökme) atlanır."""
+    done: dict[str, dict] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            done[rec["key"]] = rec
+    return done
+
+
+def _process(product: dict, key: str) -> dict:
+    from services.ai_description import generate_with_retry
+
+    t0 = time.perf_counter()
+    try:
+        text, status = generate_with_retry(product)
+        err = None
+    except Exception as e:
+        # Kalıcı kayıt ama tamamlanmış sayılmaz: yeniden çalıştırmada tekrar denenir
+        text, status, err = "", "ERROR", f"{type(e).__name__}: {e}"[:500]
+    return {
+        "key": key,
+        "new_description": text,
+        "ai_status": status,
+        "error": err,
+        "latency_s": round(time.perf_counter() - t0, 2),
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+
+
+def run_ai_batch(
+    raw_path: str = "outputs/products_raw.xlsx",
+    out_path: str = "outputs/products_with_ai.xlsx",
+    checkpoint_path: str | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rpm: float = DEFAULT_RPM,
+    retry_failed: bool = False,
+    limit: int | None = None,
+) -> dict:
+    import pandas as pd
+    from services import ai_description
+
+    checkpoint_path = checkpoint_path or os.path.splitext(out_path)[0] + ".checkpoint.jsonl"
+    df = pd.read_excel(raw_path)
+
+    done = load_checkpoint(checkpoint_path)
+    skip = {"OK"} if retry_failed else {"OK", "FAIL"}
+    todo = []
+    for idx, row in df.iterrows():
+        product = row.to_dict()
+        key = _key(product, idx)
+        if done.get(key, {}).get("ai_status") in skip:
+            continue
+        todo.append((key, product))
+    if limit is not None:
+        todo = todo[:limit]
+
+    stats = {"total": len(df), "skipped": len(df) - len(todo), "OK": 0, "FAIL": 0, "ERROR": 0}
+    ai_description.set_rate_limiter(RateLimiter(rpm, burst=concurrency))
+    t0 = time.perf_counter()
+    try:
+        with open(checkpoint_path, "a", encoding="utf-8") as ckpt, ThreadPoolExecutor(max_workers=concurrency) as ex:
+            pending = set()
+            it = iter(todo)
+            n_done = 0
+
+            def fill():
+                # Bellekte en fazla 2 x concurrency iş: büyük dosyada tüm future'lar birden kurulmaz
+                while len(pending) < concurrency * 2:
+                    nxt = next(it, None)
+                    if nxt is None:
+                        return
+                    pending.add(ex.submit(_process, nxt[1], nxt[0]))
+
+            fill()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    pending.discard(fut)
+                    rec = fut.result()
+                    ckpt.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    ckpt.flush()
+                    done[rec["key"]] = rec
+                    stats[rec["ai_status"]] += 1
+                    n_done += 1
+                    print(f"{n_done}/{len(todo)} {rec['key']} -> {rec['ai_status']}")
+                fill()
+    finally:
+        ai_description.set_rate_limiter(None)
+
+    build_excel(df, done, out_path)
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    stats["checkpoint"] = checkpoint_path
+    stats["out"] = out_path
+    return stats
+
+
+def build_excel(df, done: dict[str, dict], out_path: str) -> None:
+    """Ham tablo + checkpoint sonuçları -> son Excel."""
+    df = df.copy()
+    keys = [_key(row.to_dict(), idx) for idx, row in df.iterrows()]
+    df["new_description"] = [done.get(k, {}).get("new_description", "") for k in keys]
+    df["ai_status"] = [done.get(k, {}).get("ai_status", "") for k in keys]
+    df.to_excel(out_path, index=False)
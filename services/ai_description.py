@@ -1,10 +1,47 @@
-from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import re
+import threading
 
-load_dotenv()
+_client = None
+_client_lock = threading.Lock()
+_rate_limiter = None
 
-client = OpenAI()
+
+def get_client():
+    """
+    OpenAI client'ı ilk kullanımda oluşturur (import anında .env okuma / client kurma yok).
+    Toplu çalıştırmada thread'ler aynı anda ilk çağrıyı yapabilir: tek client / bağlantı havuzu.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from dotenv import load_dotenv
+                from openai import OpenAI
+
+                load_dotenv()
+                _client = OpenAI()
+    return _client
+
+
+def set_rate_limiter(limiter) -> None:
+    """Her API çağrısından önce limiter.acquire() çağrılır (toplu çalıştırmada eşzamanlı thread'ler için)."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def _create(**kwargs):
+    if _rate_limiter is not None:
+        _rate_limiter.acquire()
+    return get_client().responses.create(**kwargs)
+
+
+# Kullanılacak model(ler): AI_DESCRIPTION_TIERS ucuzdan güçlüye virgüllü liste;
+# kurallara uymayan çıktıda tekrar denemeler bir üst modelle yapılır.
+DEFAULT_MODEL = os.getenv("AI_DESCRIPTION_MODEL", "gpt-4.1-mini")
+MODEL_TIERS = [
+    m.strip() for m in os.getenv("AI_DESCRIPTION_TIERS", DEFAULT_MODEL).split(",") if m.strip()
+] or [DEFAULT_MODEL]
 
 # Yasaklı kelimeler (gerektikçe genişletilebilir)
 BANNED_WORDS = [
@@ -13,34 +50,76 @@ BANNED_WORDS = [
 ]
 
 
-def violates_rules(text: str) -> bool:
+def _sentence_spans(text: str) -> list[tuple[int, int]]:
+    """Cümlelerin metindeki [başlangıç, bitiş) aralıkları (aradaki boşluk / satır sonları dahil değil)."""
+    spans, start = [], 0
+    for m in re.finditer(r"(?<=[.!?])\s+", text):
+        if text[start:m.start()].strip():
+            spans.append((start, m.start()))
+        start = m.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+def _sentences(text: str) -> list[str]:
+    return [text[a:b] for a, b in _sentence_spans(text)]
+
+
+def rule_violations(text: str) -> list[dict]:
     """
-    Kurallara aykırıysa True döner
+    Kural ihlallerinin listesi (boşsa kurallara uygun).
+    Yasaklı kelimelerde ifadenin geçtiği cümlelerin sırası da döner (hedefli onarım için).
     """
     if not text:
-        return True
+        return [{"type": "EMPTY"}]
 
+    out = []
     t = text.lower()
 
     # HTML guard
     if "<" in t or ">" in t:
-        return True
+        out.append({"type": "HTML"})
 
     # Yasaklı kelimeler
+    sentences = [x.lower() for x in _sentences(text)]
     for w in BANNED_WORDS:
         if w in t:
-            return True
+            out.append({"type": "BANNED", "word": w, "sentences": [i for i, x in enumerate(sentences) if w in x]})
 
     # Çok kısa açıklama guard
-    if len(text.split()) < 100:
-        return True
+    n_words = len(text.split())
+    if n_words < 100:
+        out.append({"type": "TOO_SHORT", "words": n_words})
+
+    return out
+
+
+def violates_rules(text: str) -> bool:
+    """
+    Kurallara aykırıysa True döner
+    """
+    return bool(rule_violations(text))
 
-    return False
 
+def _feedback_lines(violations: list[dict]) -> str:
+    lines = []
+    for v in violations:
+        if v["type"] == "BANNED":
+            lines.append(f"- \"{v['word']}\" ifadesi kullanılmış; kullanma.")
+        elif v["type"] == "HTML":
+            lines.append("- HTML etiketi kullanılmış; düz metin yaz.")
+        elif v["type"] == "TOO_SHORT":
+            lines.append(f"- Metin {v['words']} kelimede kalmış; 120–160 kelimeye tamamla.")
+        elif v["type"] == "EMPTY":
+            lines.append("- Boş yanıt döndü.")
+    return "\n".join(lines)
 
-def generate_description(product: dict) -> str:
+
+def generate_description(product: dict, model: str | None = None, feedback: list[dict] | None = None) -> str:
     """
-    Tek seferlik AI açıklama üretir
+    Tek seferlik AI açıklama üretir (model verilmezse AI_DESCRIPTION_MODEL).
+    feedback: önceki denemenin kural ihlalleri; prompt'a düzeltme notu olarak eklenir.
     """
     prompt = f"""
 Ürün Bilgileri
@@ -69,8 +148,11 @@ Kurallar (zorunlu)
 - Sadece yeni ürün açıklaması (düz metin).
 """.strip()
 
-    response = client.responses.create(
-        model="gpt-4.1-mini",
+    if feedback:
+        prompt += "\n\nÖnceki denemedeki sorunlar (bunları tekrarlama)\n" + _feedback_lines(feedback)
+
+    response = _create(
+        model=model or DEFAULT_MODEL,
         input=prompt,
         max_output_tokens=350,
         temperature=0.6,
@@ -79,19 +161,87 @@ Kurallar (zorunlu)
     return response.output_text.strip()
 
 
-def generate_with_retry(product: dict, max_retries: int = 2) -> tuple[str, str]:
+def repair_description(text: str, violations: list[dict], model: str | None = None) -> str:
+    """
+    Hedefli onarım: HTML etiketleri deterministik temizlenir, sadece yasaklı ifade içeren
+    cümleler modele gönderilip yeniden yazdırılır ve kendi yerlerine konur (paragraf ve
+    satır yapısı korunur). Yarım kalmış (kesilmiş) ya da işareti eksik cümlede orijinal kalır.
+    """
+    if any(v["type"] == "HTML" for v in violations):
+        text = re.sub(r"[ \t]+", " ", re.sub(r"<[^>]+>", " ", text)).strip()
+        violations = rule_violations(text)
+
+    spans = _sentence_spans(text)
+    bad: dict[int, set[str]] = {}
+    for v in violations:
+        if v["type"] == "BANNED":
+            for i in v["sentences"]:
+                bad.setdefault(i, set()).add(v["word"])
+    if not bad:
+        return text
+
+    idx = sorted(bad)
+    numbered = "\n".join(
+        f"<<<{n}>>> {text[spans[i][0]:spans[i][1]]}  (kullanma: {', '.join(sorted(bad[i]))})"
+        for n, i in enumerate(idx, 1)
+    )
+    prompt = f"""
+Aşağıdaki cümleleri, parantez içindeki ifadeleri ve abartılı iddiaları kullanmadan,
+anlamını ve uzunluğunu koruyarak yeniden yaz. Her cümleyi kendi <<<N>>> işaretiyle döndür,
+başka bir şey yazma. Parantez içindeki notları çıktıya ekleme.
+
+{numbered}
+""".strip()
+
+    # Türkçe ~2-3 karakter/token: cümle uzunluğuna göre pay bırak (sabit pay uzun cümleyi keser)
+    budget = sum((spans[i][1] - spans[i][0]) // 2 + 20 for i in idx) + 20
+    response = _create(
+        model=model or DEFAULT_MODEL,
+        input=prompt,
+        max_output_tokens=budget,
+        temperature=0.4,
+    )
+    out = response.output_text or ""
+    marks = list(re.finditer(r"<<<(\d+)>>>\s*(.*?)(?=<<<\d+>>>|\Z)", out, re.DOTALL))
+    if getattr(response, "status", None) == "incomplete" and marks:
+        # Çıktı token sınırında kesildi: son parça yarım olabilir
+        marks = marks[:-1]
+    fixed = {int(m.group(1)): m.group(2).strip() for m in marks}
+
+    # Sondan başa: önceki cümlelerin offset'leri kaymasın
+    for n, i in reversed(list(enumerate(idx, 1))):
+        new = fixed.get(n)
+        a, b = spans[i]
+        if not new or (text[b - 1] in ".!?" and new[-1] not in ".!?…"):
+            # İşaret yok / cümle yarım bitmiş: orijinal kalır
+            continue
+        text = text[:a] + new + text[b:]
+    return text
+
+
+def generate_with_retry(
+    product: dict, max_retries: int = 2, models: list[str] | None = None
+) -> tuple[str, str]:
     """
-    Kurallara uymuyorsa tekrar dener.
+    Kurallara uymuyorsa tekrar dener; her denemede bir üst kademe modeline geçer
+    (liste biterse son modelle devam eder).
+    - sadece yasaklı ifade / HTML sorunu varsa metin yeniden üretilmez, ilgili cümleler onarılır
+    - diğer durumlarda yeniden üretim, önceki ihlaller geri bildirim olarak verilir
     Döner: (new_description, status)
     status: OK | FAIL
     """
-    last_text = ""
+    models = models or MODEL_TIERS
+    text = generate_description(product, model=models[0])
 
-    for attempt in range(max_retries + 1):
-        text = generate_description(product)
-        last_text = text
-
-        if not violates_rules(text):
+    for attempt in range(1, max_retries + 1):
+        violations = rule_violations(text)
+        if not violations:
             return text, "OK"
 
-    return last_text, "FAIL"
+        model = models[min(attempt, len(models) - 1)]
+        if all(v["type"] in ("BANNED", "HTML") for v in violations):
+            text = repair_description(text, violations, model=model)
+        else:
+            text = generate_description(product, model=model, feedback=violations)
+
+    return text, ("FAIL" if violates_rules(text) else "OK")
@@ -1,7 +1,49 @@
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 from config.trendyol_config import API_KEY, API_SECRET, SUPPLIER_ID, BASE_URL
 
+# Trendyol ürün güncelleme isteği başına azami item sayısı
+BATCH_MAX_ITEMS = 1000
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Bağlantı havuzlu, thread'ler arası paylaşılan session:
+    - keep-alive ile her istekte TLS el sıkışması yok
+    - 429 / 5xx için geri çekilmeli otomatik tekrar; sadece GET (idempotent). Toplu güncelleme
+      PUT/POST'u otomatik tekrarlanmaz: zaman aşımından sonra aynı batch iki kez gönderilebilir,
+      yazma hatalarını publish'in FAILED item tekrarı ele alır.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                retry = Retry(
+                    total=3,
+                    backoff_factor=1.0,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET"]),
+                    respect_retry_after_header=True,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.auth = HTTPBasicAuth(API_KEY, API_SECRET)
+                s.headers.update({
+                    "User-Agent": f"{SUPPLIER_ID} - SelfIntegration",
+                    "Accept": "application/json",
+                })
+                _session = s
+    return _session
+
 
 def fetch_all_products():
     all_products = []
@@ -10,11 +52,6 @@ def fetch_all_products():
 
     url = f"{BASE_URL}/product/sellers/{SUPPLIER_ID}/products"
 
-    headers = {
-        "User-Agent": f"{SUPPLIER_ID} - SelfIntegration",
-        "Accept": "application/json"
-    }
-
     while True:
         params = {
             "page": page,
@@ -22,12 +59,7 @@ def fetch_all_products():
             "approved": True
         }
 
-        response = requests.get(
-            url,
-            auth=HTTPBasicAuth(API_KEY, API_SECRET),
-            headers=headers,
-            params=params
-        )
+        response = get_session().get(url, params=params)
 
         if response.status_code != 200:
             raise Exception(
@@ -44,3 +76,38 @@ def fetch_all_products():
         page += 1
 
     return all_products
+
+
+def update_products_batch(items: list[dict], timeout: float = 60.0) -> str:
+    """
+    Toplu ürün güncelleme (asenkron). items: [{"barcode": ..., "description": ...}, ...]
+    Döner: batchRequestId (durum get_batch_request ile izlenir)
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch en fazla {BATCH_MAX_ITEMS} item olabilir: {len(items)}")
+
+    url = f"{BASE_URL}/product/sellers/{SUPPLIER_ID}/products"
+    response = get_session().put(url, json={"items": items}, timeout=timeout)
+
+    if response.status_code not in (200, 202):
+        raise Exception(
+            f"API error {response.status_code}: {response.text}"
+        )
+
+    return response.json()["batchRequestId"]
+
+
+def get_batch_request(batch_request_id: str, timeout: float = 30.0) -> dict:
+    """
+    Batch durumu: {"status": "IN_PROGRESS" | "COMPLETED", "items": [{"requestItem": {...},
+    "status": "SUCCESS" | "FAILED", "failureReasons": [...]}, ...]}
+    """
+    url = f"{BASE_URL}/product/sellers/{SUPPLIER_ID}/products/batch-requests/{batch_request_id}"
+    response = get_session().get(url, timeout=timeout)
+
+    if response.status_code != 200:
+        raise Exception(
+            f"API error {response.status_code}: {response.text}"
+        )
+
+    return response.json()
@@ -0,0 +1,143 @@
+"""
+Trendyol ürün API'si için yerel stand-in sunucu (test / yük denemesi).
+
+    python -m services.trendyol_stub_server --port 8099 --fail-rate 0.1
+    TRENDYOL_BASE_URL=http://127.0.0.1:8099/integration python -m app.pipeline publish
+
+Desteklenen uçlar:
+- GET  /integration/product/sellers/{id}/products                       (sayfalı örnek ürünler)
+- PUT  /integration/product/sellers/{id}/products                       (toplu güncelleme -> batchRequestId)
+- GET  /integration/product/sellers/{id}/products/batch-requests/{bid}  (asenkron durum)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PRODUCTS_RE = re.compile(r"^/integration/product/sellers/[^/]+/products/?$")
+_BATCH_RE = re.compile(r"^/integration/product/sellers/[^/]+/products/batch-requests/([^/]+)/?$")
+
+
+class StubState:
+    def __init__(self, fail_rate: float = 0.0, polls_until_done: int = 2, max_items: int = 1000, products: int = 0):
+        self.fail_rate = fail_rate
+        self.polls_until_done = polls_until_done
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.batches: dict[str, dict] = {}
+        self.descriptions: dict[str, str] = {}
+        self.products = [
+            {
+                "barcode": f"BC{i:06d}",
+                "title": f"Örnek Ürün {i}",
+                "description": "Örnek açıklama",
+                "brand": "XMarka",
+                "categoryName": "Tayt",
+            }
+            for i in range(products)
+        ]
+
+
+def make_handler(state: StubState):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive: istemci havuzu gerçekten kullanılsın
+
+        def _send(self, code: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            n = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(n) or b"{}")
+
+        def do_GET(self):  # noqa: N802
+            path, _, query = self.path.partition("?")
+            m = _BATCH_RE.match(path)
+            if m:
+                with state.lock:
+                    batch = state.batches.get(m.group(1))
+                    if batch is None:
+                        self._send(404, {"error": "batch not found"})
+                        return
+                    batch["polls"] += 1
+                    done = batch["polls"] > state.polls_until_done
+                    payload = {
+                        "batchRequestId": m.group(1),
+                        "status": "COMPLETED" if done else "IN_PROGRESS",
+                        "itemCount": len(batch["items"]),
+                        "items": batch["items"] if done else [],
+                    }
+                self._send(200, payload)
+                return
+
+            if _PRODUCTS_RE.match(path):
+                params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+                page, size = int(params.get("page", 0)), int(params.get("size", 50))
+                content = state.products[page * size:(page + 1) * size]
+                self._send(200, {"page": page, "size": size, "totalElements": len(state.products), "content": content})
+                return
+
+            self._send(404, {"error": "not found"})
+
+        def do_PUT(self):  # noqa: N802
+            if not _PRODUCTS_RE.match(self.path.partition("?")[0]):
+                self._send(404, {"error": "not found"})
+                return
+            items = self._read_json().get("items", [])
+            if len(items) > state.max_items:
+                self._send(400, {"error": f"max {state.max_items} items"})
+                return
+            bid = uuid.uuid4().hex
+            results = []
+            with state.lock:
+                for it in items:
+                    ok = random.random() >= state.fail_rate
+                    if ok:
+                        state.descriptions[it.get("barcode")] = it.get("description", "")
+                    results.append({
+                        "requestItem": {"barcode": it.get("barcode")},
+                        "status": "SUCCESS" if ok else "FAILED",
+                        "failureReasons": [] if ok else ["Simüle edilmiş hata"],
+                    })
+                state.batches[bid] = {"items": results, "polls": 0}
+            self._send(200, {"batchRequestId": bid})
+
+        do_POST = do_PUT
+
+        def log_message(self, *args):
+            pass
+
+    return _Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8099, state: StubState | None = None) -> ThreadingHTTPServer:
+    """Arka plan thread'inde başlatır; server.shutdown() ile durdurulur."""
+    state = state or StubState()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.state = state  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, name="trendyol-stub", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--polls-until-done", type=int, default=2)
+    ap.add_argument("--products", type=int, default=120, help="GET products için örnek ürün sayısı")
+    args = ap.parse_args()
+
+    st = StubState(args.fail_rate, args.polls_until_done, products=args.products)
+    srv = ThreadingHTTPServer((args.host, args.port), make_handler(st))
+    print(f"Trendyol stub: http://{args.host}:{args.port}/integration")
+    srv.serve_forever()
@@ -0,0 +1,109 @@
+"""
+publish akışı: yerel Trendyol stub sunucusuna karşı SENT -> PUBLISHED / FAILED geçişleri.
+
+    python -m pytest -q test_publish.py
+"""
+import pytest
+from sqlalchemy import select
+
+import services.trendyol_api as trendyol_api
+from app.db import Base, SessionLocal, build_engine
+from app.models import Generation, Product, Publication
+from app.publish import publish
+from services.trendyol_stub_server import StubState, serve
+
+
+@pytest.fixture
+def db_bind(tmp_path):
+    from app import models  # noqa: F401  (tablolar metadata'ya kaydolsun)
+
+    eng = build_engine(f"sqlite:///{tmp_path / 'publish.db'}")
+    Base.metadata.create_all(eng)
+    old_bind = SessionLocal.kw.get("bind")
+    SessionLocal.configure(bind=eng)
+    yield eng
+    SessionLocal.configure(bind=old_bind)
+    eng.dispose()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    state = StubState(polls_until_done=1)
+    server = serve(port=0, state=state)
+    monkeypatch.setattr(trendyol_api, "BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/integration")
+    yield state
+    server.shutdown()
+
+
+def _seed(n: int, fallback_reason: str | None = None) -> None:
+    with SessionLocal() as db:
+        for i in range(n):
+            p = Product(merchant_sku=f"SKU{i}", barcode=f"BC{i}", title=f"Ürün {i}")
+            db.add(p)
+            db.flush()
+            db.add(Generation(
+                product_id=p.id, version=1, model_name="stub", generated_html=f"<strong>Ürün {i}</strong>",
+                char_count=10, status="PASS", validation_report_json="{}", fallback_reason=fallback_reason,
+            ))
+        db.commit()
+
+
+def _statuses() -> dict[str, str]:
+    with SessionLocal() as db:
+        return dict(db.execute(select(Publication.barcode, Publication.status)).all())
+
+
+def test_publish_marks_items_published(db_bind, stub):
+    _seed(5)
+    r = publish(batch_size=2, concurrency=2, poll_interval=0.01)
+
+    assert r["published"] == 5 and r["failed"] == 0
+    assert set(_statuses().values()) == {"PUBLISHED"}
+    assert stub.descriptions["BC3"] == "<strong>Ürün 3</strong>"
+
+
+def test_publish_retries_failed_items_up_to_max_attempts(db_bind, stub):
+    stub.fail_rate = 1.0
+    _seed(3)
+    r = publish(batch_size=2, max_attempts=2, poll_interval=0.01)
+
+    assert r["published"] == 0 and r["failed"] == 3
+    with SessionLocal() as db:
+        rows = db.execute(select(Publication.status, Publication.attempts)).all()
+    assert rows == [("FAILED", 2)] * 3
+
+
+def test_items_missing_from_completed_batch_are_failed_not_left_sent(db_bind, stub, monkeypatch):
+    _seed(3)
+    real = trendyol_api.get_batch_request
+
+    def drop_first_item(bid, timeout=30.0):
+        data = real(bid, timeout)
+        if data.get("status") == "COMPLETED":
+            data["items"] = [it for it in data["items"] if it["requestItem"]["barcode"] != "BC0"]
+        return data
+
+    monkeypatch.setattr(trendyol_api, "get_batch_request", drop_first_item)
+    publish(max_attempts=1, poll_interval=0.01)
+
+    statuses = _statuses()
+    assert statuses["BC0"] == "FAILED"
+    assert statuses["BC1"] == statuses["BC2"] == "PUBLISHED"
+    assert "SENT" not in statuses.values()
+
+
+def test_fallback_output_is_not_published(db_bind, stub):
+    _seed(2, fallback_reason="circuit_open")
+    with SessionLocal() as db:
+        # BC1: önce gerçek üretim (v2), sonra yine stub'a düşülmüş bir deneme (v3)
+        for version, model, reason in ((2, "gpt-4.1-nano", None), (3, "stub", "circuit_open")):
+            db.add(Generation(
+                product_id=2, version=version, model_name=model, generated_html=f"<strong>v{version}</strong>",
+                char_count=10, status="PASS", validation_report_json="{}", fallback_reason=reason,
+            ))
+        db.commit()
+    r = publish(poll_interval=0.01)
+
+    assert r["published"] == 1
+    assert _statuses() == {"BC1": "PUBLISHED"}
+    assert stub.descriptions["BC1"] == "<strong>v2</strong>"